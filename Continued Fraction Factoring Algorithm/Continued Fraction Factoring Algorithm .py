@@ -6,42 +6,82 @@
 # 
 # 
 # Take  $$p_{k-1}^2-nq_{k-1}^2 = (-1)^kt_k\ (k\geq 1).$$ Expressing it as congruence modulo $n$; $$p_{k-1}^2\equiv (-1)^kt_k\ (mod\ n).$$  First calculate $p_{k-1}^2 \ (mod\ n)$ and check for a perfect square. Then apply a generalisation of Fermat's factorization scheme.
+# 
+# The expansion $\sqrt n=[a_0;a_1,a_2,...]$ is computed with integers only. The complete quotients are $x_k=\frac{\sqrt n+P_k}{Q_k}$ with $P_1=a_0=\lfloor\sqrt n\rfloor$, $Q_1=n-a_0^2$ and
+# $$
+# a_k=\Big\lfloor\frac{a_0+P_k}{Q_k}\Big\rfloor,\ \ P_{k+1}=a_kQ_k-P_k,\ \ Q_{k+1}=\frac{n-P_{k+1}^2}{Q_k},
+# $$
+# where the division is always exact, and $t_k=Q_k$. All of $P_k,Q_k,a_k$ stay below $2\sqrt n$, so no precision is lost however many steps we take, and $p_{k-1}^2\ mod\ n$ needs no squaring. The numerators $p_k=a_kp_{k-1}+p_{k-2}$ are kept modulo $n$. Most $t_k$ are not squares, and $is\_square$ rejects nearly all of them by table lookups of the residues modulo $64,63,65$ and $11$ before calling $isqrt$.
+# 
+# A perfect power $n=b^e$ has no useful expansion (for $e=2$ it is not even infinite), so $is\_perfect\_power$ is called first: it tries the $k$-th roots $\lfloor n^{1/k}\rfloor$ for the primes $k\leq\log_2 n$, computed by Newton's method on integers, and returns $(b,e)$ with the largest $e$.
 
 # In[1]:
 
 
 import math as m
-import sympy as sp
+squares_64 = [r in {j*j%64 for j in range(64)} for r in range(64)]   # squares_q[r] is True when r is a square modulo q
+squares_63 = [r in {j*j%63 for j in range(63)} for r in range(63)]
+squares_65 = [r in {j*j%65 for j in range(65)} for r in range(65)]
+squares_11 = [r in {j*j%11 for j in range(11)} for r in range(11)]
+def is_square(x):                        # isqrt only for the x that are squares modulo 64, 63, 65 and 11
+    if x < 0 or not squares_64[x & 63]:
+        return False
+    r = x%45045                          # 45045 = 63*65*11
+    if not (squares_63[r%63] and squares_65[r%65] and squares_11[r%11]):
+        return False
+    y = m.isqrt(x)
+    return y*y == x
+
+
+def iroot(x,k):                          # floor of the k-th root of x >= 0, with integers only
+    if x < 2:
+        return x
+    r = 1<<-(-x.bit_length()//k)         # r^k > x
+    while True:
+        s = ((k-1)*r+x//r**(k-1))//k     # Newton step
+        if s >= r:
+            return r
+        r = s
+
+
+def is_perfect_power(n):                 # (b, e) with n = b^e and e largest, e = 1 if n is no power (0 = 0^2, 1 = 1^2)
+    if n < 2:
+        return n,2
+    for k in range(2,n.bit_length()+1):
+        if all(k%j for j in range(2,m.isqrt(k)+1)):   # prime k only
+            b = iroot(n,k)
+            if b**k == n:
+                b,e = is_perfect_power(b)
+                return b,e*k
+    return n,1
+
+
 def cffa(n,b):             # b is bound for calculations
-    xo=sp.sqrt(n)
-    ao=m.floor(xo)
-    if xo==ao:
-        return xo,xo
+    base,e=is_perfect_power(n)
+    ao=m.isqrt(n)
+    if e>1:
+        return base,n//base
     else:
-        x1=1/(xo-ao)
-        a1=m.floor(x1)
+        P=ao               # x1 = (sqrt(n)+P)/Q
+        Q=n-ao*ao
+        a1=(ao+P)//Q
         po=ao
-        p1=a1*po+1
-        qo=1
-        q1=a1
-        k=1
-        while k<b:
+        p1=(a1*po+1)%n     # numerators are only needed modulo n
+        P=a1*Q-P
+        Q=(n-P*P)//Q       # x2
+        k=2
+        while k<=b:        # tries p_(k-1) for k = 3,...,b+1
             k=k+1
-            p=p1
-            q=q1
-            x1=1/(x1-a1)
-            a1=m.floor(x1)
-            p1=a1*p1+po
-            q1=a1*q1+qo
-            k1=(p1*p1)%n
-            sq=sp.sqrt(k1)
-            sq1=m.floor(sq)
-            if sq==sq1:
+            a1=(ao+P)//Q
+            po,p1=p1,(a1*p1+po)%n
+            P=a1*Q-P       # x_k = (sqrt(n)+P)/Q, with n-P*P divisible by Q
+            Q=(n-P*P)//Q
+            k1=Q if k%2==0 else n-Q   # p_(k-1)^2 = (-1)^k Q (mod n)
+            if is_square(k1):
+                sq1=m.isqrt(k1)
                 f1 = m.gcd(p1-sq1,n)
                 if f1%n != 1 and f1%n != 0:
                     return f1,m.gcd(p1+sq1,n)
-            po=p
-            qo=q
 
 
 # In[31]:
@@ -81,6 +121,271 @@ print(end-st)
 cffa(27909,1000)
 
 
+# ### Continued Fraction Method (CFRAC) of Morrison and Brillhart
+# 
+# Waiting for some $(-1)^kQ_k$ to be a perfect square is rare. Instead, as in the quadratic sieve, we keep every $Q_k$ that factors completely over a $factor\ base$ of small primes, $Q_k=\prod p_j^{e_{kj}}$, together with the sign $(-1)^k$ as an extra column. A prime $p\mid Q_k$ satisfies $n\equiv P_k^2\ (mod\ p)$, so only $2$ and the primes with $\big(\frac{n}{p}\big)=1$ are needed. Once we have more relations than primes, some of them have exponent vectors adding to zero modulo $2$; Gaussian elimination over $GF(2)$ finds them, and for such a set $S$
+# $$
+# x=\prod_{k\in S}p_{k-1},\ \ y=\prod_j p_j^{\frac12\sum_{k\in S}e_{kj}},\ \ x^2\equiv y^2\ (mod\ n),
+# $$
+# so $gcd(x-y,n)$ is a divisor, non-trivial in about half of the cases.
+# 
+# The expansion of $\sqrt n$ is periodic: once $(P_k,Q_k)$ is back at $(P_1,Q_1)$ the same $Q_k$ come again, so no new relations can be found. $cfrac\_relations$ stops there, and if there are not enough relations $cfrac$ returns $None$ (another multiplier $k$ gives another period).
+# 
+# $Early\ abort$: most $Q_k$ are not smooth, and trial division by the whole factor base is the main cost. So we first divide only by the first quarter of the factor base, and give up on $Q_k$ if what is left is still larger than $Q_k^{3/4}$. The residues of $Q_k$ modulo all the primes of a part are computed at once with numpy.
+# 
+# $Large\ prime\ variation$: if after the factor base a prime $c<L$ is left, we keep the $partial$ relation. Two partial relations with the same $c$ multiply to a full one, with $c^2$ going into $y$.
+# 
+# $Multiplier$: we expand $\sqrt{kn}$ instead of $\sqrt n$ for the small square-free $k$ chosen by the Knuth-Schroeppel score $F(k)=-\frac12\log k+\sum_p g(p)$, the same as in the quadratic sieve: $g(p)=\frac{2\log p}{p-1}$ if $\big(\frac{kn}{p}\big)=1$, $\frac{\log p}{p}$ if $p\mid k$, and $g(2)$ depends on $kn\ mod\ 8$. A relation modulo $kn$ is also one modulo $n$, so the gcd is taken with $n$.
+
+# In[ ]:
+
+
+import numpy as np
+def cfrac_factor_base(B,n):   # 2 and the odd primes p <= B with (n/p) = 1
+    sieve = bytearray([1])*(B+1)
+    sieve[:2] = bytes(2)
+    for i in range(2,m.isqrt(B)+1):
+        if sieve[i]:
+            sieve[i*i::i] = bytes(len(range(i*i,B+1,i)))
+    return [p for p in range(2,B+1) if sieve[p] and (p == 2 or n%p == 0 or pow(n,(p-1)//2,p) == 1)]
+
+
+def mod_many(x,P):            # x mod p for every p in the array P < 2^31, from 30-bit pieces of x
+    r = np.zeros_like(P)
+    for k in range((x.bit_length()+29)//30-1,-1,-1):
+        r = ((r<<30)+((x>>(30*k)) & (2**30-1)))%P
+    return r
+
+
+def cfrac_relations(n,factor_base,early_abort=True,large_prime_bound=0,state=None):  # yields (p_(k-1) mod n, {column: power} of (-1)^k Q_k, large prime or 1)
+    split = len(factor_base)//4 if early_abort else len(factor_base)
+    parts = [np.array(factor_base[:split],dtype=np.int64),np.array(factor_base[split:],dtype=np.int64)]
+    ao = m.isqrt(n)
+    po,p1 = 1,ao                # p_(k-2), p_(k-1) mod n
+    P,Q = ao,n-ao*ao            # x_k = (sqrt(n)+P)/Q
+    k = 1
+    if state:                   # continue the expansion from a checkpoint
+        k,P,Q,po,p1 = state["k"],state["P"],state["Q"],state["po"],state["p1"]
+    while k == 1 or (P,Q) != (ao,n-ao*ao):   # the expansion repeats after one period
+        num = Q
+        relation = None
+        powers = {0: k%2}       # column 0 is the sign (-1)^k
+        for part,start in zip(parts,[0,split]):
+            if len(part) == 0:
+                continue
+            for i in np.nonzero(mod_many(num,part) == 0)[0].tolist():
+                p = factor_base[start+i]
+                while num%p == 0:
+                    powers[start+i+1] = powers.get(start+i+1,0)+1
+                    num = num//p
+            if start == 0 and early_abort and num.bit_length() > 3*Q.bit_length()//4:
+                break           # early abort
+        else:
+            if num == 1 or num < large_prime_bound:
+                relation = (p1,powers,num)
+        a = (ao+P)//Q
+        po,p1 = p1,(a*p1+po)%n
+        P = a*Q-P
+        Q = (n-P*P)//Q
+        k = k+1
+        if state is not None:   # the next step, updated in place for checkpoints
+            state.update(k=k,P=P,Q=Q,po=po,p1=p1)
+        if relation is not None:
+            yield relation
+
+
+def knuth_schroeppel(n,bound=2000,max_k=100):   # odd square-free multiplier k with the best score F(k)
+    sieve = bytearray([1])*bound
+    sieve[:2] = bytes(2)
+    for i in range(2,m.isqrt(bound)+1):
+        if sieve[i]:
+            sieve[i*i::i] = bytes(len(range(i*i,bound,i)))
+    small = [p for p in range(3,bound) if sieve[p]]
+    best_k,best = 1,None
+    for k in range(1,max_k+1,2):
+        if any(k%(p*p) == 0 for p in small[:5]):
+            continue
+        N = k*n
+        score = -0.5*m.log(k)+m.log(2)*{1: 2,5: 1}.get(N%8,0.5)
+        for p in small:
+            if k%p == 0:
+                score += m.log(p)/p
+            elif pow(N%p,(p-1)//2,p) == 1:
+                score += 2*m.log(p)/(p-1)
+        if best is None or score > best:
+            best_k,best = k,score
+    return best_k
+
+
+def gf2_null_space(rows,history):               # every combination of rows adding to zero, as bits of history
+    pivots = {}                                 # lowest set bit -> (row, history)
+    dependencies = []
+    for row,h in zip(rows,history):
+        while row:
+            bit = row & -row
+            if bit not in pivots:
+                pivots[bit] = (row,h)
+                break
+            row ^= pivots[bit][0]
+            h ^= pivots[bit][1]
+        else:
+            dependencies.append(h)
+    return dependencies
+
+
+def cfrac(n,B,early_abort=True,large_prime_bound=None,multiplier=None):   # n odd composite, B bound for the factor base, k (None to choose)
+    b,e = is_perfect_power(n)
+    if e > 1:
+        return b,n//b
+    k = knuth_schroeppel(n) if multiplier is None else multiplier
+    factor_base = cfrac_factor_base(B,k*n)
+    for p in factor_base:
+        if n%p == 0:
+            return p,n//p
+    if large_prime_bound is None:
+        large_prime_bound = min(64*factor_base[-1],factor_base[-1]**2)
+    relations = []              # (x, powers, y factor)
+    partial = {}                # large prime -> (x, powers)
+    for x,powers,large in cfrac_relations(k*n,factor_base,early_abort,large_prime_bound):
+        combine_relation(relations,partial,x,powers,large,n)
+        if len(relations) >= len(factor_base)+10:
+            break
+    return cfrac_divisor(n,factor_base,relations)
+
+
+def combine_relation(relations,partial,x,powers,large,n):   # a full relation, or a pair of partial ones with the same large prime
+    if large == 1:
+        relations.append((x,powers,1))
+    elif large in partial:      # large^2 goes into y
+        x2,powers2 = partial[large]
+        for j,power in powers2.items():
+            powers[j] = powers.get(j,0)+power
+        relations.append((x*x2%n,powers,large))
+    else:
+        partial[large] = (x,powers)
+
+
+def cfrac_divisor(n,factor_base,relations):   # divisor from the relations (x, powers, y factor), or None
+    rows = [sum(1<<j for j,power in powers.items() if power%2) for x,powers,c in relations]
+    for dependency in gf2_null_space(rows,[1<<i for i in range(len(rows))]):
+        x_value,y_value = 1,1
+        total = {}
+        for i in range(len(relations)):
+            if dependency>>i & 1:
+                x,powers,c = relations[i]
+                x_value = x_value*x%n
+                y_value = y_value*c%n
+                for j,power in powers.items():
+                    total[j] = total.get(j,0)+power
+        for j,power in total.items():
+            if j:
+                y_value = y_value*pow(factor_base[j-1],power//2,n)%n
+        f1 = m.gcd(x_value-y_value,n)
+        if f1 != 1 and f1 != n:
+            return f1,n//f1
+
+
+# In[ ]:
+
+
+import time
+for n,B in [(1000000000099987889,600),(7000000000282000000000351,2500),(150000000000061600000000005073,8000),(210000000000000017600000000000000363,20000)]:
+    st = time.perf_counter()
+    print(cfrac(n,B))
+    end = time.perf_counter()
+    print(end-st)
+
+
+# ### Checkpoints
+# 
+# A long CFRAC run can be saved the same way as the quadratic sieve runs: every relation is appended to a text file as soon as it is found, followed by the state of the expansion after it, $s$ ($k$, $P_k$, $Q_k$, $p_{k-2}$ and $p_{k-1}$ modulo $kn$). The other lines are $h$ (cfrac, $n$, $B$, the multiplier), $f$ (the factor base) and $r$ ($p_{k-1}$, the large prime or $1$, and the non-zero powers $column$^$power$). $cfrac\_relations$ updates the dictionary $state$ in place, and started from a saved $state$ it continues the expansion from there, so calling $cfrac\_checkpoint$ again with the same file resumes the run. A line cut off by a crash, and a relation without its $s$ line, are dropped from the file, since that step of the expansion is done again.
+
+# In[ ]:
+
+
+import os
+def read_cfrac_checkpoint(path):   # header, factor base, relations (x, powers, large prime), state of the expansion
+    header,factor_base,relations,state,saved = None,[],[],{},0
+    with open(path) as file:
+        text = file.read()
+    for line in text[:text.rfind("\n")+1].splitlines():   # only complete lines
+        kind,*fields = line.split()
+        if kind == "h":
+            header = (fields[0],int(fields[1]),int(fields[2]),int(fields[3]))
+        elif kind == "f":
+            factor_base = [int(p) for p in fields]
+        elif kind == "r":
+            relations.append((int(fields[0]),{int(j): int(power) for j,power in (field.split("^") for field in fields[2:])},int(fields[1])))
+        elif kind == "s":
+            state = dict(zip(["k","P","Q","po","p1"],(int(field) for field in fields)))
+            saved = len(relations)
+    return header,factor_base,relations[:saved],state
+
+
+def open_cfrac_checkpoint(path,n,B,k,factor_base):   # appends to path, writing the header for a new file
+    if os.path.exists(path):
+        with open(path,"rb+") as file:   # drop everything after the last s line
+            lines = file.read().splitlines(keepends=True)
+            last = max([i for i,line in enumerate(lines) if line.endswith(b"\n") and line[:2] in (b"f ",b"s ")],default=-1)
+            file.truncate(sum(len(line) for line in lines[:last+1]))
+        return open(path,"a")
+    file = open(path,"a")
+    file.write("h cfrac {} {} {}\n".format(n,B,k))
+    file.write("f "+" ".join(str(p) for p in factor_base)+"\n")
+    file.flush()
+    return file
+
+
+def cfrac_checkpoint(n,B,path,early_abort=True,large_prime_bound=None,multiplier=None):   # cfrac() saving its relations and the expansion to path
+    b,e = is_perfect_power(n)
+    if e > 1:
+        return b,n//b
+    k = knuth_schroeppel(n) if multiplier is None else multiplier
+    factor_base = cfrac_factor_base(B,k*n)
+    for p in factor_base:
+        if n%p == 0:
+            return p,n//p
+    if large_prime_bound is None:
+        large_prime_bound = min(64*factor_base[-1],factor_base[-1]**2)
+    relations,partial,state = [],{},{}
+    if os.path.exists(path):
+        header,factor_base,saved,state = read_cfrac_checkpoint(path)
+        if header != ("cfrac",n,B,k):
+            raise ValueError("checkpoint {} is for {}".format(path,header))
+        for x,powers,large in saved:
+            combine_relation(relations,partial,x,powers,large,n)
+    with open_cfrac_checkpoint(path,n,B,k,factor_base) as file:
+        for x,powers,large in cfrac_relations(k*n,factor_base,early_abort,large_prime_bound,state):
+            file.write("r {} {} ".format(x,large)+" ".join("{}^{}".format(j,power) for j,power in powers.items() if power)+"\n")
+            file.write("s {k} {P} {Q} {po} {p1}\n".format(**state))   # everything before step k is saved
+            file.flush()
+            combine_relation(relations,partial,x,powers,large,n)
+            if len(relations) >= len(factor_base)+10:
+                break
+    return cfrac_divisor(n,factor_base,relations)
+
+
+# In[ ]:
+
+
+import multiprocessing
+import tempfile
+n = 150000000000061600000000005073
+path = os.path.join(tempfile.mkdtemp(),"cfrac_{}.txt".format(n))
+process = multiprocessing.get_context("fork").Process(target=cfrac_checkpoint,args=(n,8000,path))
+process.start()
+time.sleep(0.5)
+process.kill()                            # the run is pre-empted
+print(len(read_cfrac_checkpoint(path)[2]),"relations saved")
+st = time.perf_counter()
+print(cfrac_checkpoint(n,8000,path))
+end = time.perf_counter()
+print(end-st)
+x_values = [x for x,powers,large in read_cfrac_checkpoint(path)[2]]
+assert len(x_values) == len(set(x_values))
+os.remove(path)
+
+
 # ### CFFA Time analysis in general
 
 # In[10]:
@@ -130,19 +435,18 @@ def fermat1(n):
     factors = []
     if n%2 == 0:
         while n%2 == 0:
-            n = n/2
+            n = n//2
         factors.append(2)
-    n_root = m.sqrt(n)
-    k = m.ceil(n_root)  
-    if k == n_root:
-        factors.append([n_root,n_root])
+    b,e = is_perfect_power(n)
+    if e > 1:                            # n = b^e
+        factors.append([b,n//b])
     else:
-        y2 = int(k*k-n)
-        y = m.isqrt(y2)
-        while y*y!=y2:
+        k = m.isqrt(n)+1
+        y2 = k*k-n
+        while not is_square(y2):
+            y2 = y2+2*k+1                # (k+1)^2-n from k^2-n
             k=k+1
-            y2=int(k*k-n)
-            y=m.isqrt(y2)
+        y = m.isqrt(y2)
         factors.append([k+y,k-y])
     return factors 
 
@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# # <font color=purple>**Elliptic Curve Method (ECM)**</font>
+
+# ### Theory :
+# Pollard $(p-1)$ works in the group $(\mathbb{Z}/p\mathbb{Z})^*$ of order $p-1$, and fails when $p-1$ is not smooth. Lenstra replaced it by the group of points of an elliptic curve $E$ modulo $p$, whose order $\#E(\mathbb{F}_p)$ lies in $[p+1-2\sqrt p,\ p+1+2\sqrt p]$ and changes with the curve. If for one curve $\#E(\mathbb{F}_p)$ is $B_1$-smooth, then $[k]P=O$ modulo $p$ for $k=\prod_{q\leq B_1}q^{\lfloor\log_qB_1\rfloor}$ and every point $P$, while modulo $n$ it is not the neutral point, so $gcd(Z_{[k]P},n)$ gives $p$. A new curve is a new chance, so ECM finds $p$ in a time depending mainly on the size of $p$, not of $n$: it is the method for factors of $10$ to $35$ digits of large $n$.
+# 
+# $Montgomery\ curves$: on $By^2=x^3+Ax^2+x$ the $x$-coordinate of $[k]P$ can be computed without $y$. With $x=X/Z$ and $a_{24}=\frac{A+2}4$:
+# $$
+# [2]P:\ \ X_{2P}=(X+Z)^2(X-Z)^2,\ \ Z_{2P}=4XZ\big((X-Z)^2+a_{24}\cdot4XZ\big),\ \ \ 4XZ=(X+Z)^2-(X-Z)^2,
+# $$
+# $$
+# P+Q\ from\ P-Q:\ \ X_{P+Q}=Z_{P-Q}\big(u+v\big)^2,\ \ Z_{P+Q}=X_{P-Q}\big(u-v\big)^2,\ \ \ u=(X_P-Z_P)(X_Q+Z_Q),\ v=(X_P+Z_P)(X_Q-Z_Q).
+# $$
+# No inversions are needed. $[k]P$ comes from the $ladder$ which keeps $R_0=[j]P$ and $R_1=[j+1]P$, so that $R_1-R_0=P$ is always known.
+# 
+# $Suyama's\ parametrization$: for $\sigma\geq 6$ take $u=\sigma^2-5$, $v=4\sigma$, $P=(u^3:v^3)$ and $a_{24}=\frac{(v-u)^3(3u+v)}{16u^3v}$. Then $12$ divides $\#E(\mathbb{F}_p)$, which makes it more likely to be smooth. If $16u^3v$ is not invertible modulo $n$, the gcd is already a divisor.
+# 
+# $Stage\ 1$ multiplies $P$ by the prime powers $q^{\lfloor\log_qB_1\rfloor}$ one after the other. The list of prime powers is computed once for each $B_1$ and used by every curve.
+# 
+# $Stage\ 2$: as for $(p-1)$, we also find $p$ when $\#E=sQ$ with $s$ $B_1$-smooth and one prime $B_1<Q\leq B_2$. With $Q=mD\pm d$, $0<d<D/2$, $gcd(d,D)=1$ and $D=2310$, $[Q]P'=O$ for the point $P'$ after stage 1 means $[mD]P'=\pm[d]P'$, which is $X_{[mD]}Z_{[d]}-X_{[d]}Z_{[mD]}\equiv 0\ (mod\ p)$. The baby steps $[d]P'$ are computed once, the giant steps $[mD]P'$ follow each other by one addition, and the products of $X_{[mD]}Z_{[d]}-X_{[d]}Z_{[mD]}$ over all $mD\pm d$ prime need a single gcd at the end.
+# 
+# Every curve is independent of the others, so curves with different $\sigma$ can run on several processes at once, and the first divisor found stops them all.
+
+# In[ ]:
+
+
+import itertools
+import math
+import multiprocessing
+import random
+def iroot(x,k):                          # floor of the k-th root of x >= 0, with integers only
+    if x < 2:
+        return x
+    r = 1<<-(-x.bit_length()//k)         # r^k > x
+    while True:
+        s = ((k-1)*r+x//r**(k-1))//k     # Newton step
+        if s >= r:
+            return r
+        r = s
+
+
+def is_perfect_power(n):                 # (b, e) with n = b^e and e largest, e = 1 if n is no power (0 = 0^2, 1 = 1^2)
+    if n < 2:
+        return n,2
+    for k in range(2,n.bit_length()+1):
+        if all(k%j for j in range(2,math.isqrt(k)+1)):   # prime k only
+            b = iroot(n,k)
+            if b**k == n:
+                b,e = is_perfect_power(b)
+                return b,e*k
+    return n,1
+
+
+def prime_flags(B):                      # bytearray with 1 at the primes <= B
+    flags = bytearray([1])*(B+1)
+    flags[:2] = bytes(2)
+    for p in range(2,math.isqrt(B)+1):
+        if flags[p]:
+            flags[p*p::p] = bytes(len(range(p*p,B+1,p)))
+    return flags
+
+
+stage2_pairs = {}                        # (B1, B2, D) -> first m, and for every m the indices of the d with mD+d or mD-d prime
+def prime_pairs(B1,B2,D):
+    if (B1,B2,D) not in stage2_pairs:
+        flags = prime_flags(B2+D)
+        ds = [d for d in range(1,D//2,2) if math.gcd(d,D) == 1]
+        m = max(B1//D,1)
+        pairs = []
+        while m*D-D//2 <= B2:
+            pairs.append([j for j,d in enumerate(ds) if flags[m*D+d] or flags[m*D-d]])
+            m = m+1
+        stage2_pairs[(B1,B2,D)] = (max(B1//D,1),pairs)
+    return stage2_pairs[(B1,B2,D)]
+
+
+stage1_powers = {}                       # B1 -> prime powers q^[log_q B1] for the primes q <= B1
+def prime_ladder(B1):
+    if B1 not in stage1_powers:
+        powers = []
+        for q in itertools.compress(range(B1+1),prime_flags(B1)):
+            qk = q
+            while qk*q <= B1:
+                qk = qk*q
+            powers.append(qk)
+        stage1_powers[B1] = powers
+    return stage1_powers[B1]
+
+
+# ### Arithmetic modulo $n$
+# 
+# All the work is multiplications modulo the same $n$. Montgomery's representation $\bar a=aR\ mod\ n$ with $R=2^k$ replaces the division in $ab\ mod\ n$ by $REDC(T)=(T+((T\cdot n')\ mod\ R)\cdot n)/R$ with the precomputed $n'=-n^{-1}\ mod\ R$, which needs only multiplications and shifts. In C this is faster than a division, but in Python the three multiplications and the shift take longer than the one $\%$ of the interpreter (timings below), so the residues are kept as they are and reduced with $\%$.
+# 
+# What does save time is $Montgomery's\ trick$ for inverses: with the products $c_i=a_1a_2\cdots a_i$, one inversion $c_k^{-1}$ gives $a_k^{-1}=c_k^{-1}c_{k-1}$, then $c_{k-1}^{-1}=c_k^{-1}a_k$, and so on down to $a_1$. So $k$ inverses cost one inversion and $3(k-1)$ multiplications. If $c_k$ is not invertible, $gcd(c_k,n)$ is returned instead, which for ECM is a divisor. In stage 2 all baby steps $[d]P$ and giant steps $[mD]P$ are brought to $Z=1$ at once, and every prime $Q=mD\pm d$ then costs the single multiplication by $x_{[mD]}-x_{[d]}$ instead of three.
+
+# In[ ]:
+
+
+def batch_inverse(values,n):             # Montgomery's trick: (g, inverses) with g = gcd(product of values, n), the inverses only if g = 1
+    prefix = []                          # a_1, a_1a_2, ..., a_1...a_k
+    product = 1
+    for a in values:
+        product = product*a%n
+        prefix.append(product)
+    g = math.gcd(product,n)
+    if g != 1:
+        return g,None
+    inverse = pow(product,-1,n)          # (a_1...a_i)^-1, for i = k down to 1
+    inverses = [0]*len(values)
+    for i in range(len(values)-1,0,-1):
+        inverses[i] = inverse*prefix[i-1]%n
+        inverse = inverse*values[i]%n
+    if values:
+        inverses[0] = inverse
+    return 1,inverses
+
+
+# In[ ]:
+
+
+import time
+for bits in [64,200,1000]:
+    n = random.getrandbits(bits) | 1<<(bits-1) | 1
+    R,mask = 1<<bits,(1<<bits)-1
+    n_ = -pow(n,-1,R)%R
+    a,b = random.randrange(n),random.randrange(n)
+    strt = time.perf_counter()
+    for i in range(100000):
+        c = a*b%n
+    end = time.perf_counter()
+    print(bits,"bits, % :",end-strt)
+    strt = time.perf_counter()
+    for i in range(100000):
+        T = a*b
+        c = (T+((T*n_) & mask)*n)>>bits
+        if c >= n:
+            c = c-n
+    end = time.perf_counter()
+    print(bits,"bits, REDC :",end-strt)
+n = 1000000000099987889
+values = [random.randrange(1,n) for i in range(1000)]
+g,inverses = batch_inverse(values,n)
+print(g,all(a*b%n == 1 for a,b in zip(values,inverses)))
+
+
+# In[ ]:
+
+
+def xdbl(X,Z,n,a24):                     # [2]P
+    s = (X+Z)*(X+Z)%n
+    d = (X-Z)*(X-Z)%n
+    t = s-d                              # 4XZ
+    return s*d%n,t*(d+a24*t)%n
+
+
+def xadd(X1,Z1,X2,Z2,X0,Z0,n):           # P1+P2 from P1, P2 and P1-P2 = (X0:Z0)
+    u = (X1-Z1)*(X2+Z2)%n
+    v = (X1+Z1)*(X2-Z2)%n
+    return Z0*(u+v)*(u+v)%n,X0*(u-v)*(u-v)%n
+
+
+def ladder(k,X,Z,n,a24):                 # [k]P for k >= 1
+    X0,Z0 = X,Z                          # [j]P
+    X1,Z1 = xdbl(X,Z,n,a24)              # [j+1]P
+    for bit in bin(k)[3:]:
+        if bit == "1":
+            X0,Z0 = xadd(X1,Z1,X0,Z0,X,Z,n)
+            X1,Z1 = xdbl(X1,Z1,n,a24)
+        else:
+            X1,Z1 = xadd(X0,Z0,X1,Z1,X,Z,n)
+            X0,Z0 = xdbl(X0,Z0,n,a24)
+    return X0,Z0
+
+
+def ecm_curve(n,B1,B2,sigma,D=2310):     # divisor of n from the Suyama curve of sigma, or None
+    u = (sigma*sigma-5)%n
+    v = 4*sigma%n
+    X,Z = pow(u,3,n),pow(v,3,n)
+    denominator = 16*X*v%n
+    g = math.gcd(denominator,n)
+    if g != 1:
+        return g if g != n else None
+    a24 = pow(v-u,3,n)*(3*u+v)*pow(denominator,-1,n)%n
+    for qk in prime_ladder(B1):          # stage 1
+        X,Z = ladder(qk,X,Z,n,a24)
+    g = math.gcd(Z,n)
+    if g != 1:
+        return g if g != n else None
+    baby = {1: (X,Z)}                    # stage 2, [d]P for odd d < D/2
+    X2,Z2 = xdbl(X,Z,n,a24)
+    baby[3] = xadd(X2,Z2,X,Z,X,Z,n)
+    for d in range(5,D//2,2):
+        baby[d] = xadd(*baby[d-2],X2,Z2,*baby[d-4],n)
+    baby = [baby[d] for d in baby if math.gcd(d,D) == 1]
+    m,pairs = prime_pairs(B1,B2,D)
+    XD,ZD = ladder(D,X,Z,n,a24)
+    XR,ZR = ladder(m*D,X,Z,n,a24)        # [mD]P
+    XT,ZT = ladder((m-1)*D,X,Z,n,a24) if m > 1 else (X,Z)   # [(m-1)D]P, for m = 1 any point with Z != 0 is not used
+    giant = []
+    for i in range(len(pairs)):
+        giant.append((XR,ZR))
+        if m+i == 1:
+            XR,ZR,XT,ZT = *xdbl(XD,ZD,n,a24),XR,ZR
+        else:
+            XR,ZR,XT,ZT = *xadd(XR,ZR,XD,ZD,XT,ZT,n),XR,ZR
+    g,inverses = batch_inverse([Z for X,Z in baby+giant],n)   # all points to Z = 1
+    if g != 1:
+        return g if g != n else None
+    x = [X*inverse%n for (X,Z),inverse in zip(baby+giant,inverses)]
+    xd,xR = x[:len(baby)],x[len(baby):]
+    product = 1
+    for i in range(len(pairs)):
+        for j in pairs[i]:
+            product = product*(xR[i]-xd[j])%n
+    g = math.gcd(product,n)
+    if g != 1 and g != n:
+        return g
+
+
+# In[ ]:
+
+
+def curve_worker(n,B1,B2,tasks,results,stop):
+    while not stop.is_set():
+        sigma = tasks.get()
+        if sigma is None:
+            break
+        results.put(ecm_curve(n,B1,B2,sigma))
+
+
+def ecm(n,B1,B2=None,curves=100,processes=1):   # divisor of n from at most curves curves, or None
+    b,e = is_perfect_power(n)
+    if e > 1:
+        return b
+    B2 = 100*B1 if B2 is None else B2
+    sigmas = [random.randrange(6,n-1) for i in range(curves)]
+    if processes == 1:
+        for sigma in sigmas:
+            g = ecm_curve(n,B1,B2,sigma)
+            if g is not None:
+                return g
+        return None
+    context = multiprocessing.get_context("fork")
+    prime_ladder(B1)                     # computed once, before the fork
+    prime_pairs(B1,B2,2310)
+    tasks,results,stop = context.Queue(),context.Queue(),context.Event()
+    for sigma in sigmas:
+        tasks.put(sigma)
+    for i in range(processes):
+        tasks.put(None)
+    workers = [context.Process(target=curve_worker,args=(n,B1,B2,tasks,results,stop)) for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    g = None
+    for i in range(curves):
+        g = results.get()
+        if g is not None:
+            break
+    stop.set()
+    for worker in workers:
+        worker.terminate()
+        worker.join()
+    return g
+
+
+# ### Choice of $B_1$
+# 
+# The usual bounds for a factor of a given number of digits, with the expected number of curves (for $B_2=100B_1$):
+# 
+# | digits of $p$ | $B_1$ | curves |
+# |---|---|---|
+# | $15$ | $2000$ | $25$ |
+# | $20$ | $11000$ | $90$ |
+# | $25$ | $50000$ | $300$ |
+# | $30$ | $250000$ | $700$ |
+# | $35$ | $1000000$ | $1800$ |
+
+# In[ ]:
+
+
+import time
+for n,B1,curves in [(2**101-1,2000,100),(2**67-1,2000,100),(1000000000000000003*1000000000000000009*100000000000031,2000,100)]:
+    strt = time.perf_counter()
+    print(n,ecm(n,B1,curves=curves))
+    end = time.perf_counter()
+    print(f'Time taken = {end-strt}')
+
+
+# In[ ]:
+
+
+import sympy as sp
+p = sp.nextprime(random.randint(10**14,10**15))
+n = p*sp.nextprime(random.randint(10**39,10**40))
+for processes in [1,2,4]:
+    strt = time.perf_counter()
+    print(processes,ecm(n,2000,curves=300,processes=processes) == p)
+    end = time.perf_counter()
+    print(f'Time taken = {end-strt}')
+
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# # <font color=purple>**Factorization Pipeline**</font>
+
+# ### Theory :
+# No single method is best for every $n$. Trial division removes the small primes at once, Pollard rho finds a prime $p$ in about $\sqrt p$ steps whatever the size of $n$, Pollard $(p-1)$ finds $p$ when $p-1$ is smooth, and the quadratic sieve needs a time depending only on the size of $n$, so it is the method for the factors that are left when $n$ is a product of two large primes. A composite $n=b^k$ makes every method fail, so perfect powers are reduced first. The pipeline runs these stages in order of cost:
+# 
+# $1.$ trial division up to a bound $T$, after which every factor left is larger than $T$,
+# 
+# $2.$ a primality test (Miller-Rabin) on what is left, which ends the work for a prime,
+# 
+# $3.$ perfect powers $c=b^k$ are replaced by $b$ with $k$ times the exponent ($is\_perfect\_power$ of the Fermat notebook),
+# 
+# $4.$ a short run of Pollard rho and of Pollard $(p-1)$,
+# 
+# $5.$ for large $c$ the elliptic curve method, which looks for factors of up to a third of the digits of $c$, as larger factors are found faster by the sieve,
+# 
+# $6.$ the self initializing quadratic sieve if $c$ has enough digits, Pollard rho with growing bounds otherwise.
+# 
+# Every divisor $d$ found splits $c$ into $d$ and $c/d$, which go through the stages $2.$ to $6.$ again, until only primes are left. The result is the map $\{p:e\}$ with $n=\prod p^e$.
+# 
+# The methods are taken from the other notebooks: only their cells with definitions are run, the examples are skipped.
+
+# In[ ]:
+
+
+import ast
+import os
+import re
+here = os.path.dirname(os.path.abspath(__file__)) if "__file__" in globals() else os.getcwd()   # Jupyter runs in the notebook's folder
+def notebook(folder,name):               # namespace with the definitions of ../folder/name.py (an export of the notebook)
+    path = os.path.join(here,os.pardir,folder,name+".py")
+    namespace = {"__name__": "__main__"}
+    for cell in re.split(r"\n# In\[[ 0-9]*\]:\n",open(path,encoding="utf-8").read())[1:]:
+        tree = ast.parse(cell)
+        if all(isinstance(s,(ast.Import,ast.ImportFrom,ast.FunctionDef,ast.ClassDef,ast.Assign)) for s in tree.body):
+            exec(compile(tree,path,"exec"),namespace)
+    return namespace
+
+fermat = notebook("Fermat's Factorization Schemes","Fermat's Factorization Schemes")
+pollard = notebook("Pollard's Algorithms","Pollard Algorithms")
+cf = notebook("Continued Fraction Factoring Algorithm","Continued Fraction Factoring Algorithm ")
+qs = notebook("Quadratic Sieve Algorithm","Quadratic Sieve Algorithm")
+ec = notebook("Elliptic Curve Method","Elliptic Curve Method")
+mr = notebook("Miller-Rabin Test","Miller-Rabin Test")
+
+
+# ### Dispatch
+# 
+# The bounds of every stage are kept in $thresholds$, and the factor base bound $B$ and sieve half length $M$ of the quadratic sieve in $siqs\_table$, one row $(digits,B,M)$ for each size of $n$ up to $digits$. $ecm\_table$ has the rows $(digits\ of\ p,B_1,curves)$ of the elliptic curve method, and for $c$ with $D$ digits the rows with $digits\ of\ p\leq D/thresholds["ecm"]$ are run. They are chosen from the timings of the benchmark below, and can be changed without touching the code. Every method returns its result in its own way (a divisor, a string or a tuple), so each one is wrapped to give a divisor or $None$.
+
+# In[ ]:
+
+
+thresholds = {"trial": 10**4,            # trial division bound T
+              "rho": 2000,               # length of the first Pollard rho sequence
+              "p-1": 1000,               # q of the first Pollard (p-1), the exponent is lcm(1,...,q)
+              "siqs": 19,                # digits from which the quadratic sieve is used
+              "ecm": 3,                  # ECM looks for factors with up to 1/3 of the digits
+              "rounds": 20}              # Miller-Rabin random bases, above 3.3*10^24
+ecm_table = [(15,2000,25),(20,11000,90),(25,50000,300),(30,250000,700)]
+siqs_table = [(20,600,8000),(24,1200,16000),(28,2500,32000),(32,5000,32000),(36,10000,65536),(40,20000,65536),(45,40000,65536),(50,80000,65536)]
+
+def is_prime(c):                         # c odd and larger than 3
+    return mr["rabin_miller"](c,thresholds["rounds"]) != "Composite"
+
+def rho(c,bound,a=1):                    # divisor from Brent's rho with x1 = 2, f(x) = x^2+a, or None
+    return pollard["pollard_brent"](c,2,a,bound)
+
+def pm1(c,q):                            # divisor from pollard1, or None
+    result = pollard["pollard1"](c,q)
+    return None if result == "Failure" else result
+
+def siqs_parameters(digits):             # (B, M) of the first row covering digits
+    for row in siqs_table:
+        if digits <= row[0]:
+            return row[1:]
+    return siqs_table[-1][1:]
+
+def split(c):                            # proper divisor of c, c odd, composite and not a perfect power
+    d = rho(c,thresholds["rho"])
+    if d is None:
+        d = pm1(c,thresholds["p-1"])
+    digits = len(str(c))
+    for row in ecm_table:
+        if d is not None or row[0] > digits/thresholds["ecm"]:
+            break
+        d = ec["ecm"](c,row[1],curves=row[2])
+    attempt = 1
+    while d is None:                     # a failure only makes the next attempt larger
+        if digits >= thresholds["siqs"]:
+            B,M = siqs_parameters(digits)
+            d = qs["siqs_divisor"](B*attempt,M,c)
+        else:
+            d = rho(c,thresholds["rho"]*4**attempt,attempt+1)
+        attempt = attempt+1
+    return d
+
+def factor(n):                           # {prime: exponent} with n = product of prime^exponent, n >= 1
+    factors,rest = fermat["trial"](n,thresholds["trial"])
+    stack = [(rest,1)]                   # cofactors with their multiplicity
+    while stack:
+        c,e = stack.pop()
+        if c == 1:
+            continue
+        if is_prime(c):
+            factors[c] = factors.get(c,0)+e
+            continue
+        b,k = fermat["is_perfect_power"](c)
+        if k > 1:
+            stack.append((b,e*k))
+            continue
+        d = split(c)
+        stack.append((d,e))
+        stack.append((c//d,e))
+    return dict(sorted(factors.items()))
+
+
+# In[ ]:
+
+
+import time
+for n in [1234567895341,1689243484681,2**64+1,2**101-1,1000000000099987889,7000000000282000000000351**2*3**7,150000000000061600000000005073,210000000000000017600000000000000363]:
+    strt = time.perf_counter()
+    print(n,factor(n))
+    end = time.perf_counter()
+    print(f'Time taken = {end-strt}')
+
+
+# ### Benchmark
+# 
+# Products of two primes of the same size are the hardest case for every method. The timings of Pollard rho, the continued fraction method and the quadratic sieve on them show from how many digits the quadratic sieve is faster, which is $thresholds["siqs"]$, and which $B,M$ to put in $siqs\_table$.
+
+# In[ ]:
+
+
+import math
+import random
+import sympy as sp
+import time
+def benchmark(digits_list,k):            # average time of each method on k products of two primes with digits/2 digits
+    for digits in digits_list:
+        times = {"rho": 0,"cfrac": 0,"siqs": 0}
+        for i in range(k):
+            c = sp.nextprime(random.randrange(10**(digits//2-1),10**(digits//2)))*sp.nextprime(random.randrange(10**(digits//2-1),10**(digits//2)))
+            B,M = siqs_parameters(digits)
+            for name,method in [("rho",lambda: rho(c,40*math.isqrt(math.isqrt(c)))),("cfrac",lambda: cf["cfrac"](c,B)),("siqs",lambda: qs["siqs_divisor"](B,M,c))]:
+                if name == "rho" and digits > 20:
+                    continue
+                strt = time.perf_counter()
+                method()
+                end = time.perf_counter()
+                times[name] = times[name]+(end-strt)/k
+        print(digits,"digits:",", ".join(f"{name} {t:.3f}s" for name,t in times.items() if t))
+
+
+# In[ ]:
+
+
+benchmark([12,16,20,24,28,32],3)
+
@@ -15,27 +15,67 @@
 # 
 # It returns large factors not necessarily prime. Direct mathod of factoring by number less than $\sqrt n$ works better for integers with small factors as in case of large integers $\sqrt n$ is large, increasing the number of computations to find factors near $\sqrt n$.
 
+# Testing every $y^2=k^2-n$ for a square with $isqrt$ is the main cost of the loop. A square is also a square modulo every $q$, and modulo $64,63,65$ and $11$ only $12,16,21$ and $6$ residues are squares. So a table lookup for each of these moduli rejects all but about $\frac{12}{64}\cdot\frac{16}{63}\cdot\frac{21}{65}\cdot\frac{6}{11}\approx 0.8\%$ of the non-squares, and only the rest go to $isqrt$. Also $(k+1)^2-n=(k^2-n)+2k+1$, so no squaring is needed inside the loop.
+
+# If $n=b^e$ with $e\geq 2$ then $b$ is already a divisor, while the methods below would waste their whole budget on it (a cube $p^3$ is far from any $x^2-y^2$ with $x-y$ near $\sqrt n$). The $k$-th root $\lfloor x^{1/k}\rfloor$ is computed with integers by Newton's method $r\mapsto\Big\lfloor\frac{(k-1)r+\lfloor x/r^{k-1}\rfloor}{k}\Big\rfloor$, which decreases from any $r>x^{1/k}$ and stops at the root. As $b^{jk}=(b^j)^k$, only prime $k\leq\log_2 n$ have to be tried, and the base of a $k$-th power is tested again to get the largest exponent. The factoring functions call $is\_perfect\_power$ first.
+
 # In[9]:
 
 
 import math as m
+squares_64 = [r in {j*j%64 for j in range(64)} for r in range(64)]   # squares_q[r] is True when r is a square modulo q
+squares_63 = [r in {j*j%63 for j in range(63)} for r in range(63)]
+squares_65 = [r in {j*j%65 for j in range(65)} for r in range(65)]
+squares_11 = [r in {j*j%11 for j in range(11)} for r in range(11)]
+def is_square(x):                        # isqrt only for the x that are squares modulo 64, 63, 65 and 11
+    if x < 0 or not squares_64[x & 63]:
+        return False
+    r = x%45045                          # 45045 = 63*65*11
+    if not (squares_63[r%63] and squares_65[r%65] and squares_11[r%11]):
+        return False
+    y = m.isqrt(x)
+    return y*y == x
+
+
+def iroot(x,k):                          # floor of the k-th root of x >= 0, with integers only
+    if x < 2:
+        return x
+    r = 1<<-(-x.bit_length()//k)         # r^k > x
+    while True:
+        s = ((k-1)*r+x//r**(k-1))//k     # Newton step
+        if s >= r:
+            return r
+        r = s
+
+
+def is_perfect_power(n):                 # (b, e) with n = b^e and e largest, e = 1 if n is no power (0 = 0^2, 1 = 1^2)
+    if n < 2:
+        return n,2
+    for k in range(2,n.bit_length()+1):
+        if all(k%j for j in range(2,m.isqrt(k)+1)):   # prime k only
+            b = iroot(n,k)
+            if b**k == n:
+                b,e = is_perfect_power(b)
+                return b,e*k
+    return n,1
+
+
 def fermat1(n):
     factors = []
     if n%2 == 0:
         while n%2 == 0:
-            n = n/2
+            n = n//2
         factors.append(2)
-    n_root = m.sqrt(n)
-    k = m.ceil(n_root)  
-    if k == n_root:
-        factors.append([n_root,n_root])
+    b,e = is_perfect_power(n)
+    if e > 1:                            # n = b^e
+        factors.append([b,n//b])
     else:
-        y2 = int(k*k-n)
-        y = m.isqrt(y2)
-        while y*y!=y2:
+        k = m.isqrt(n)+1
+        y2 = k*k-n
+        while not is_square(y2):
+            y2 = y2+2*k+1                # (k+1)^2-n from k^2-n
             k=k+1
-            y2=int(k*k-n)
-            y=m.isqrt(y2)
+        y = m.isqrt(y2)
         factors.append([k+y,k-y])
     return factors 
 
@@ -80,6 +120,117 @@ end = time.perf_counter()
 print(f'Time taken = {end-strt}')
 
 
+# ### Sieving the values of $k$
+# 
+# For unbalanced factors $a\gg b$ the loop runs for about $\frac{(\sqrt a-\sqrt b)^2}{2}$ values of $k$, and still tests each one. But whether $k^2-n$ can be a square modulo $q$ depends only on $k\ mod\ q$. So for each of a few small moduli $q$ we precompute the table of residues $r$ for which $r^2-n$ is a square modulo $q$. The first three tables are combined into a $wheel$: the residues of $k$ modulo $64\cdot 63\cdot 65=262080$ allowed by all three. We then step through the $k$ one wheel turn at a time, look up the allowed $k$ of the turn in the remaining tables at once (with numpy), and test only those allowed by every table. As in $fermat1$, $k^2-n$ is not squared again for every $k$: from one allowed $k$ to the next allowed $k'$ it is updated as $k'^2-n=(k^2-n)+(k'+k)(k'-k)$, where $k'-k$ is small. The $k$ left are squares modulo $64,63,65$ and $11$ already, so $is\_square$ would only repeat its table lookups, and $isqrt$ is called directly.
+
+# In[ ]:
+
+
+import numpy as np
+sieve_moduli = [64,63,65,11,17,19,23,29,31,37,41,43]
+def fermat_sieve(n):                     # fermat1() testing only the k allowed modulo every q in sieve_moduli
+    factors = []
+    if n%2 == 0:
+        while n%2 == 0:
+            n = n//2
+        factors.append(2)
+    b,e = is_perfect_power(n)
+    if e > 1:                            # n = b^e
+        factors.append([b,n//b])
+        return factors
+    k = m.isqrt(n)+1
+    tables = []
+    for q in sieve_moduli:
+        squares = np.zeros(q,dtype=bool)
+        squares[np.arange(q)**2%q] = True
+        tables.append((q,squares[(np.arange(q)**2-n%q)%q]))   # r -> is r^2-n a square mod q
+    wheel_size = 64*63*65
+    r = np.arange(wheel_size)
+    allowed = np.ones(wheel_size,dtype=bool)
+    for q,table in tables[:3]:
+        allowed &= table[r%q]
+    wheel = np.nonzero(allowed)[0]      # k mod 64*63*65 allowed by the first three tables
+    base = k-k%wheel_size
+    y2 = k*k-n                           # k^2-n for the last k tested
+    while True:
+        allowed = np.ones(len(wheel),dtype=bool)
+        for q,table in tables[3:]:
+            allowed &= table[(base%q+wheel)%q]
+        offsets = wheel[allowed]
+        if k > base:                     # the first turn starts at k
+            offsets = offsets[offsets >= k-base]
+        for w in offsets.tolist():
+            y2 = y2+(base+w+k)*(base+w-k)   # (base+w)^2-n = (k^2-n)+(base+w+k)(base+w-k)
+            k = base+w
+            y = m.isqrt(y2)              # y2 is a square modulo every q already
+            if y*y == y2:
+                factors.append([k+y,k-y])
+                return factors
+        base = base+wheel_size
+
+
+# In[ ]:
+
+
+for n in [1234567895341,1689243484681,124124,49]:
+    strt = time.perf_counter()
+    print(fermat1(n),fermat_sieve(n))
+    end = time.perf_counter()
+    print(f'Time taken = {end-strt}')
+
+
+# ##### fermat1 vs fermat_sieve for odd non-prime $d$-digit numbers, as in analysis3 below
+
+# In[ ]:
+
+
+import matplotlib.pyplot as plt
+import sympy as sp
+import random
+def analysis4(B,k):
+    x = []
+    y1 = []
+    y2 = []
+    for n in range(2,B):
+        start = 10**(n)
+        end = 10**(n+1)
+        st = (end-start)//k
+        time_list1 = []
+        time_list2 = []
+        for i in range(1,k):
+            L = random.randint(start,start+st)
+            while L%2 == 0 or sp.isprime(L) == True:
+                L = random.randint(start,start+st)
+            start = start+ st
+            s = time.perf_counter()
+            fermat1(L)
+            e = time.perf_counter()
+            time_list1.append(e-s)
+            s = time.perf_counter()
+            fermat_sieve(L)
+            e = time.perf_counter()
+            time_list2.append(e-s)
+        x.append(n+1)
+        y1.append(sum(time_list1)/len(time_list1))
+        y2.append(sum(time_list2)/len(time_list2))
+    plt.figure(figsize=(20,10))
+    plt.title("Execution Time Variation")
+    plt.plot(x,y1, color = 'b')
+    plt.plot(x,y2, color = 'r')
+    plt.xlabel('No of digits')
+    plt.ylabel('Time of Execution(seconds)')
+    plt.legend(['fermat1','fermat_sieve'])
+    plt.show()
+    return y1,y2
+
+
+# In[ ]:
+
+
+analysis4(9,10)
+
+
 # # Running Time Analysis
 
 # ##### For prime inputs only
@@ -212,22 +363,81 @@ analysis3(10,50)
 
 # ### Factoring by Numbers Less than $\sqrt n$
 
+# Only primes need to be tried, and we try many of them at once: $n$ has a prime factor among $p_1,...,p_r$ exactly when $gcd(n,p_1p_2...p_r)>1$. The primes below $2^{16}$ are kept in a $product\ tree$: the primes are the leaves and every node is the product of its two children. Starting from the root we go down only into the nodes with $gcd(n,node)>1$, so a single gcd with the root rules out all $6542$ primes when $n$ has none of them, and every prime factor is found in about $\log_2 6542\approx 13$ steps. Above $2^{16}$ we use the candidates prime to $2\cdot 3\cdot 5\cdot 7=210$, which are $48$ out of every $210$ numbers (a $wheel$), and compute $n$ modulo about $200000$ of them at once with numpy. A composite candidate never divides what is left of $n$, as its prime factors are already divided out. Every prime found is divided out as often as it divides, and the search ends at $\sqrt{rest}$.
+
 # In[21]:
 
 
-def trial(n):
-    x= math.floor(m.sqrt(n))
-    for i in range(2,x+1):
-        if n%i==0:
-            print("Factors=",i,n/i)
-            break
+def prime_tree(limit):                   # primes below limit and their product tree, levels[0] are the primes
+    sieve = bytearray([1])*limit
+    sieve[:2] = bytes(2)
+    for i in range(2,m.isqrt(limit)+1):
+        if sieve[i]:
+            sieve[i*i::i] = bytes(len(range(i*i,limit,i)))
+    levels = [[p for p in range(limit) if sieve[p]]]
+    while len(levels[-1]) > 1:
+        last = levels[-1]
+        levels.append([math.prod(last[i:i+2]) for i in range(0,len(last),2)])
+    return levels
+
+
+trial_limit = 1<<16
+prime_levels = prime_tree(trial_limit)
+wheel_210 = np.array([r for r in range(1,211) if m.gcd(r,210) == 1],dtype=np.int64)
+wheel_span = 210*4096                    # numbers covered by one batch of the wheel
+wheel_offsets = (np.arange(0,wheel_span,210,dtype=np.int64)[:,None]+wheel_210).ravel()
+
+
+def tree_divisors(x,levels,bound):       # primes p <= bound among the leaves dividing x
+    found = []
+    stack = [(len(levels)-1,0)]
+    while stack:
+        level,i = stack.pop()
+        if m.gcd(x,levels[level][i]) == 1:
+            continue
+        if level == 0:
+            if levels[0][i] <= bound:
+                found.append(levels[0][i])
+        else:
+            stack.extend((level-1,j) for j in (2*i,2*i+1) if j < len(levels[level-1]))
+    return sorted(found)
+
+
+def mod_many(x,P):                       # x mod p for every p in the array P < 2^33, from 30-bit pieces of x
+    r = np.zeros_like(P)
+    for k in range((x.bit_length()+29)//30-1,-1,-1):
+        r = ((r<<30)+((x>>(30*k)) & (2**30-1)))%P
+    return r
+
+
+def trial(n,bound=None):                 # ({p: e} for the primes p <= bound dividing n, rest of n)
+    factors = {}
+    rest = n
+    bound = min(m.isqrt(n) if bound is None else bound,1<<33)
+    for p in tree_divisors(rest,prime_levels,bound):
+        while rest%p == 0:
+            factors[p] = factors.get(p,0)+1
+            rest = rest//p
+    base = trial_limit-trial_limit%210
+    while base < min(bound,m.isqrt(rest)):   # the wheel above the table
+        c = base+wheel_offsets
+        c = c[(c >= trial_limit) & (c <= bound)]
+        for p in c[mod_many(rest,c) == 0].tolist():
+            while rest%p == 0:
+                factors[p] = factors.get(p,0)+1
+                rest = rest//p
+        base = base+wheel_span
+    if rest > 1 and m.isqrt(rest) <= bound:   # no factor upto sqrt(rest), so rest is prime
+        factors[rest] = factors.get(rest,0)+1
+        rest = 1
+    return factors,rest
 
 
 # In[22]:
 
 
 strt = time.perf_counter()
-trial(1234567895341)
+print(trial(1234567895341))
 end = time.perf_counter()
 print(f'Time taken = {end-strt}')
 
@@ -236,7 +446,7 @@ print(f'Time taken = {end-strt}')
 
 
 strt = time.perf_counter()
-trial(1689243484681)
+print(trial(1689243484681))
 end = time.perf_counter()
 print(f'Time taken = {end-strt}')
 
@@ -255,32 +465,27 @@ def fermat2(n):
     factors = []
     if n%2 == 0:
         while n%2 == 0:
-            n = n/2
+            n = n//2
         factors.append(2)
     n = int(n)
-    root_n = m.sqrt(n)
-    x = m.ceil(root_n)
-    if x == root_n:
-        factors.append([x,x])
+    b,e = is_perfect_power(n)
+    if e > 1:                            # n = b^e
+        factors.append([b,n//b])
     else:
+        x = m.isqrt(n)+1
         x2 = x*x
         y2 = x2-n
-        root_y2 = m.sqrt(y2)
-        y = m.ceil(root_y2)
         k=2
-        while y*y!=y2:
+        while not is_square(y2):
             if x2>k*n:
                 y2 = x2-k*n
-                root_y2 = m.sqrt(y2)
-                y = m.ceil(root_y2)
                 k=k+1
             else:
                 x= x+1
                 x2 = x*x
                 y2 = x2-n
-                root_y2 = m.sqrt(y2)
-                y = m.ceil(root_y2)
-        factors.append([m.gcd(int(x-y),n),m.gcd(int(x+y),n)])
+        y = m.isqrt(y2)
+        factors.append([m.gcd(x-y,n),m.gcd(x+y,n)])
     return factors
 
 
@@ -389,3 +594,94 @@ def analysis3(B,k):
 
 analysis3(6,10)
 
+
+# ## 3. Lehman's Method and Hart's One Line Factoring
+
+# $Lehman$: if $n$ has no prime factor below $n^{1/3}$ and $n=ab$ is composite, then for some $1\leq k\leq n^{1/3}$ there are $x,y$ with
+# $$
+# x^2-4kn=y^2,\ \ \ 2\sqrt{kn}\leq x\leq 2\sqrt{kn}+\frac{n^{1/6}}{4\sqrt k},
+# $$
+# and $gcd(x+y,n)$ is a proper divisor. This is generalized Fermat with a bounded range of $x$ for each $k$: there are about $\sum_k \frac{n^{1/6}}{4\sqrt k}\approx \frac{n^{1/3}}2$ values of $x$ in total, so together with trial division upto $n^{1/3}$ the method takes $O(n^{1/3})$ steps, and if it finds nothing then $n$ is prime. The bound on $x$ is computed with integers as $x^2\leq 4kn+n^{2/3}+\frac{n^{1/3}}{16k}$.
+# 
+# $Hart$: for $i=1,2,3,...$ take $s=\lceil\sqrt{ni}\rceil$ and $t=s^2\ mod\ n$. If $t$ is a square then $s^2\equiv t\ (mod\ n)$ gives the divisor $gcd(s-\sqrt t,n)$. After the same trial division upto $n^{1/3}$ it is simpler and usually faster than Lehman, but has no proven bound, so after $n^{1/3}$ values of $i$ we hand over to Lehman.
+
+# In[ ]:
+
+
+def lehman(n):
+    factors = []
+    if n%2 == 0:
+        while n%2 == 0:
+            n = n//2
+        factors.append(2)
+    b,e = is_perfect_power(n)
+    if e > 1:
+        factors.append([b,n//b])
+        return factors
+    B = iroot(n,3)
+    for a in range(3,B+1,2):             # trial division upto n^(1/3)
+        if n%a == 0:
+            factors.append([a,n//a])
+            return factors
+    c = iroot(n*n,3)+1                    # n^(2/3), rounded up
+    for k in range(1,B+1):
+        x = m.isqrt(4*k*n)
+        if x*x < 4*k*n:
+            x = x+1
+        x_max = m.isqrt(4*k*n+c+B//(16*k)+1)
+        y2 = x*x-4*k*n
+        while x <= x_max:
+            if is_square(y2):
+                d = m.gcd(x+m.isqrt(y2),n)
+                if 1 < d < n:
+                    factors.append([d,n//d])
+                    return factors
+            y2 = y2+2*x+1                # (x+1)^2-4kn
+            x = x+1
+    factors.append([n,1])                # n is prime
+    return factors
+
+
+def hart(n):
+    factors = []
+    if n%2 == 0:
+        while n%2 == 0:
+            n = n//2
+        factors.append(2)
+    b,e = is_perfect_power(n)
+    if e > 1:
+        factors.append([b,n//b])
+        return factors
+    B = iroot(n,3)
+    for a in range(3,B+1,2):             # trial division upto n^(1/3), as for lehman
+        if n%a == 0:
+            factors.append([a,n//a])
+            return factors
+    for i in range(1,B+1):
+        s = m.isqrt(n*i)
+        if s*s < n*i:
+            s = s+1
+        t = s*s%n
+        if is_square(t):
+            d = m.gcd(s-m.isqrt(t),n)
+            if 1 < d < n:
+                factors.append([d,n//d])
+                return factors
+    return factors+lehman(n)             # no bound is known for hart, lehman always ends
+
+
+# In[ ]:
+
+
+import sympy as sp
+for d in range(12,21,2):                 # semiprimes with d digits, factors of d/3 and 2d/3 digits
+    p = sp.nextprime(random.randint(10**(d//3-1),10**(d//3)))
+    q = sp.nextprime(10**d//p)
+    n = p*q
+    for f in [hart,lehman]:
+        strt = time.perf_counter()
+        result = f(n)
+        end = time.perf_counter()
+        print(d,f.__name__,result,f'Time taken = {end-strt}')
+
+
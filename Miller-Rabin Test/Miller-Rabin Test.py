@@ -3,27 +3,38 @@
 
 # ## Miller-Rabin test for compositeness
 
+# Write $N-1=2^hm$ with $m$ odd. If $N$ is prime then for every base $x$ either $x^m\equiv 1$ or $x^{2^jm}\equiv -1\ (mod\ N)$ for some $0\leq j<h$, and each $x^{2^{j+1}m}$ is the square of $x^{2^jm}$, so one power and at most $h-1$ squarings test a base. A composite $N$ passes for at most $\frac14$ of the bases, and for small $N$ it is known exactly which bases are enough: every composite $N<2047$ fails for $x=2$, every composite $N<2^{64}$ fails for one of the $7$ bases $2,325,9375,28178,450775,9780504,1795265022$, and every composite $N<3.3\cdot10^{24}$ for one of the primes upto $41$. Below these bounds the answer "Prime" is certain and no random bases are needed. Above them $k$ random bases are tried and the answer is "Undecided" if all pass.
+
 # In[55]:
 
 
 import random 
-def rabin_miller(N,k): # N : Any odd integer
-        m=(N-1)/2
-        h=1
-        while m%2==0:
-            m=int(m/2)
-            h = h+1
-        m = int(m)
-        for i in range(k):
-            x = random.randint(2,N-1)
-            if pow(x,m,N)!=1:
-                l=0
-                for j in range(h):
-                    if pow(x,pow(2,j)*m,N)!=N-1:
-                        l=l+1
-                if l==h:
-                    return "Composite"
-        return "Undecided"
+witnesses = [(2047,[2]),(1373653,[2,3]),(25326001,[2,3,5]),(3215031751,[2,3,5,7]),(2152302898747,[2,3,5,7,11]),
+             (3474749660383,[2,3,5,7,11,13]),(341550071728321,[2,3,5,7,11,13,17]),
+             (2**64,[2,325,9375,28178,450775,9780504,1795265022]),
+             (318665857834031151167461,[2,3,5,7,11,13,17,19,23,29,31,37]),
+             (3317044064679887385961981,[2,3,5,7,11,13,17,19,23,29,31,37,41])]   # (bound, bases) proven for all N < bound
+def rabin_miller(N,k): # N : Any odd integer > 1, k random bases when N is above all bounds
+        h=((N-1)&(1-N)).bit_length()-1   # N-1 = 2^h*m with m odd
+        m=(N-1)>>h
+        bases=next((bases for bound,bases in witnesses if N<bound),None)
+        deterministic=bases is not None
+        if not deterministic:
+            bases=[random.randint(2,N-1) for i in range(k)]
+        for x in bases:
+            x=x%N
+            if x==0:
+                continue
+            y=pow(x,m,N)
+            if y==1 or y==N-1:
+                continue
+            for j in range(h-1):             # x^(2^j*m) by squaring
+                y=y*y%N
+                if y==N-1:
+                    break
+            else:
+                return "Composite"
+        return "Prime" if deterministic else "Undecided"
 
 
 # In[56]:
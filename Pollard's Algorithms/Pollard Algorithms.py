@@ -10,21 +10,113 @@
 # Because $q=(p-1).j$ for some $j$, we get: $$m\equiv a^q \equiv (a^{p-1})^j\equiv 1^j=1\ mod(p)$$
 #  From above we get $p|(m-1)$. So we get $gcd(m-1,n)>1$ as our non-trivial divisor as long as $m\not \equiv 1\ mod(n)$. If $gcd(m-1,n)=1$ we do the same for different base $a$. It works better for integers with small factors.
 
+# A perfect power $n=b^e$ has the divisor $b$ for free, while rho still needs about $\sqrt p$ steps for a prime $p|b$ and $(p-1)$ still needs $p-1$ to be smooth. So both first check for it: $\lfloor n^{1/k}\rfloor$ is computed with Newton's method on integers for the primes $k\leq\log_2 n$, and $b$ is returned as the divisor.
+
+# In[ ]:
+
+
+import math
+def iroot(x,k):                          # floor of the k-th root of x >= 0, with integers only
+    if x < 2:
+        return x
+    r = 1<<-(-x.bit_length()//k)         # r^k > x
+    while True:
+        s = ((k-1)*r+x//r**(k-1))//k     # Newton step
+        if s >= r:
+            return r
+        r = s
+
+
+def is_perfect_power(n):                 # (b, e) with n = b^e and e largest, e = 1 if n is no power (0 = 0^2, 1 = 1^2)
+    if n < 2:
+        return n,2
+    for k in range(2,n.bit_length()+1):
+        if all(k%j for j in range(2,math.isqrt(k)+1)):   # prime k only
+            b = iroot(n,k)
+            if b**k == n:
+                b,e = is_perfect_power(b)
+                return b,e*k
+    return n,1
+
+
+# ### Two stages
+# Instead of $q=lcm(1,2,...,B_1)$ it is enough to take the prime powers: $q=\prod_{p\leq B_1}p^{\lfloor\log_pB_1\rfloor}$ is the same number. The primes come from a sieve in segments, and $a^q$ is computed one segment at a time with a $gcd(a^{q'}-1,n)$ after each, so a divisor is found as soon as the primes of $p-1$ have been used. If a gcd is $n$, all prime factors of $n$ were found in the same segment, and the segment is done again one prime power at a time. The segments start short and double in length, so a very smooth $p-1$ is found after a few gcds.
+# 
+# $Stage\ 2$: often $p-1=sQ$ with $s$ $B_1$-smooth and one prime $B_1<Q\leq B_2$. With $x=a^q$ from stage 1, $p|gcd(x^Q-1,n)$. For consecutive primes $Q_i<Q_{i+1}$ we have $x^{Q_{i+1}}=x^{Q_i}\cdot x^{Q_{i+1}-Q_i}$, and the gaps $Q_{i+1}-Q_i$ are small even numbers, so with a table of $x^d$ for the gaps every prime costs one multiplication instead of a power. The products of $x^{Q_i}-1$ are collected and one gcd is taken for each segment. Usually $B_2=100B_1$.
+
 # In[1]:
 
 
 import math 
 import random as r
-import numpy as np
-from decimal import Decimal
-def pollard1(n,q):
-    list1 = [i for i in range(1,q+1)]
-    lcm = 1
-    for i in list1:
-        lcm = lcm*i//math.gcd(lcm, i)
-    base = r.randint(2,n-1)
-    m=pow(base,lcm,n)
-    gcd=math.gcd(m-1,n)
+import itertools
+def prime_segments(lo,hi,size=1<<10):   # lists of the primes lo <= p < hi, the segments double in length upto 2^16
+    small = bytearray([1])*(math.isqrt(hi)+1)
+    base = []                            # primes upto sqrt(hi)
+    for p in range(2,len(small)):
+        if small[p]:
+            base.append(p)
+            small[p*p::p] = bytes(len(range(p*p,len(small),p)))
+    start = max(lo,2)
+    while start < hi:
+        end = min(start+size,hi)
+        segment = bytearray([1])*(end-start)
+        for p in base:
+            if p*p >= end:
+                break
+            first = max(p*p,(start+p-1)//p*p)
+            segment[first-start::p] = bytes(len(range(first,end,p)))
+        yield [start+i for i in itertools.compress(range(end-start),segment)]
+        start,size = end,min(2*size,1<<16)
+
+
+def prime_power(p,B):                    # largest power of p <= B
+    pk = p
+    while pk*p <= B:
+        pk = pk*p
+    return pk
+
+
+def pollard1(n,q,B2=None):               # stage 1 with the prime powers upto q, stage 2 with one more prime upto B2 (100q)
+    b,e = is_perfect_power(n)
+    if e > 1:
+        return b
+    B2 = 100*q if B2 is None else B2
+    x = r.randint(2,n-1)
+    gcd = math.gcd(x,n)
+    for primes in prime_segments(2,q+1) if gcd == 1 else []:
+        powers = [prime_power(p,q) for p in primes]
+        y = pow(x,math.prod(powers),n)
+        gcd = math.gcd(y-1,n)
+        if gcd == n:                     # one prime power at a time
+            for pk in powers:
+                y = pow(x,pk,n)
+                gcd = math.gcd(y-1,n)
+                if gcd != 1:
+                    break
+                x = y
+        if gcd != 1:
+            break
+        x = y
+    gaps = {}                            # x^d for the gaps d between the primes of stage 2
+    def walk(y,last,primes):             # x^Q for the primes Q after last, from y = x^last
+        for Q in primes:
+            if Q-last not in gaps:
+                gaps[Q-last] = pow(x,Q-last,n)
+            y = y*gaps[Q-last]%n
+            last = Q
+            yield y
+    y,last = pow(x,q,n),q
+    for primes in prime_segments(q+1,B2+1) if gcd == 1 else []:
+        product,z = 1,y
+        for z in walk(y,last,primes):
+            product = product*(z-1)%n
+        gcd = math.gcd(product,n)
+        if gcd == n:                     # one prime at a time
+            gcd = next(g for g in (math.gcd(z-1,n) for z in walk(y,last,primes)) if g != 1)
+        if gcd != 1:
+            break
+        y,last = z,primes[-1] if primes else last
     if gcd != n and gcd != 1: 
         return gcd
     else:                     
@@ -121,18 +213,20 @@ analysis(20,10)
 
 # f(x) = x^2 + a
 import math
-def pollard2(n,x1,a,bound):      # a!= 0 and -2, x1 = initial value of sequence {x_i}
-    list1=[x1]
-    for i in range(1,bound):
-        x1=(pow(x1,2)+a)%n 
-        list1.append(x1)
-    for i in range(1,int(bound/2)):
-            n1=list1[2*i]-list1[i]
-            gc=math.gcd(n1,n)
-            if n1%n!=0 and gc>1:
-                print("Period(w.r.t. Divisor)=",i)
-                return "Divisor=",gc
-                break 
+def pollard2(n,x1,a,bound):      # a!= 0 and -2, x1 = initial value of sequence {x_i}, divisor of n or None
+    b,e = is_perfect_power(n)
+    if e > 1:
+        return b
+    x,y = x1,x1                  # x_i and x_(2i), the only terms kept
+    for i in range(1,bound//2):
+        x = (x*x+a)%n
+        y = (y*y+a)%n
+        y = (y*y+a)%n
+        gc = math.gcd(y-x,n)
+        if gc == n:              # x_(2i) = x_i (mod n), another x1 or a is needed
+            return None
+        if gc > 1:
+            return gc
 
 
 # In[8]:
@@ -210,3 +304,144 @@ pollard2(242796132135923,1,1,2700)
 end = time.perf_counter()
 print(f'Time taken = {end-strt}')
 
+
+# ### Brent's cycle detection
+# $pollard2$ keeps only $x_t$ and $x_{2t}$, but evaluates $f$ three times and computes a gcd at every step. Brent compares $x_k$ only with $x_{2^i-1}$ for $2^i\leq k<2^{i+1}$: the saved value $x$ is replaced at every power of $2$, so again only $x$ and the current $y=x_k$ are kept. Once $2^i$ exceeds the tail and the period of the sequence modulo $d$, some $x_k\equiv x\ (mod\ d)$ is met, after about as many steps of $f$ as with $x_{2t}$ and $x_t$ but with one evaluation of $f$ per step instead of three.
+# 
+# The gcds are also batched: $gcd(\prod_k|x-x_k|\ mod\ n,\ n)>1$ exactly when one of the $gcd(x-x_k,n)>1$, so the product over a block of $m\approx 100$ steps needs a single gcd. If the product becomes $0\ mod\ n$ (all prime factors found in the same block), we go back to the start of the block and take the gcd at every step. If that also gives $n$, the sequence has the same period modulo $n$ and modulo $d$, and another $a$ is needed.
+
+# In[ ]:
+
+
+def pollard_brent(n,x1=2,a=1,bound=10**6,m=100):   # divisor of n from f(x) = x^2+a, or None after about bound steps
+    b,e = is_perfect_power(n)
+    if e > 1:
+        return b
+    y,r,q,g = x1,1,1,1
+    while g == 1 and r <= bound:
+        x = y                            # x = x_(r-1), compared with x_r,...,x_(2r-1)
+        for i in range(r):
+            y = (y*y+a)%n
+        k = 0
+        while k < r and g == 1:
+            ys = y                       # start of the block, for backtracking
+            for i in range(min(m,r-k)):
+                y = (y*y+a)%n
+                q = q*abs(x-y)%n
+            g = math.gcd(q,n)
+            k = k+m
+        r = 2*r
+    if g == n:                           # the block went past the divisor, one gcd per step
+        g = 1
+        while g == 1:
+            ys = (ys*ys+a)%n
+            g = math.gcd(abs(x-ys),n)
+    if 1 < g < n:
+        return g
+
+
+# In[ ]:
+
+
+import time
+for n,bound in [(1234567895341,100),(242796132135923,2700),(1000000000099987889,100000),(7000000000282000000000351,10**7)]:
+    for name,method in [("pollard2",lambda: pollard2(n,1,1,bound)),("pollard_brent",lambda: pollard_brent(n,1,1,bound))]:
+        strt = time.perf_counter()
+        print(name,method())
+        end = time.perf_counter()
+        print(f'Time taken = {end-strt}')
+
+
+# ### Several walks at once
+# A walk fails when its sequence has the same period modulo $n$ as modulo $d$, or when it is longer than the bound, and then another $x_1$ or $a$ is as good a chance as the first. Walks with different $(x_1,a)$ are independent, so they can run on several processes: every process takes a walk from a queue, the first divisor found stops all of them, and a walk that fails is replaced by a new one with the next constant $a$. The expected time is that of the luckiest of the walks. A bound too small for the smallest prime factor would make every walk fail, so after every round of $processes$ walks the bound is multiplied by $4$. The walks go on until a divisor is found, which for a composite $n$ always happens, so a prime $n$ is recognised first with the Miller-Rabin test on the first $12$ prime bases (deterministic for $n<3.3\cdot10^{24}$) and gives $None$.
+
+# In[ ]:
+
+
+import multiprocessing
+def is_probable_prime(n):                # Miller-Rabin with the first 12 prime bases, deterministic below 3.3*10^24
+    bases = [2,3,5,7,11,13,17,19,23,29,31,37]
+    if n < 2:
+        return False
+    if n in bases:
+        return True
+    if any(n%p == 0 for p in bases):
+        return False
+    d,s = n-1,0
+    while d%2 == 0:
+        d,s = d//2,s+1
+    for a in bases:
+        x = pow(a,d,n)
+        if x == 1 or x == n-1:
+            continue
+        for i in range(s-1):
+            x = x*x%n
+            if x == n-1:
+                break
+        else:
+            return False
+    return True
+
+
+def rho_walks(n,processes,bound):        # (x1, a, bound) without end, the bound grows 4 times in every round of processes walks
+    a = 0
+    for i in itertools.count():
+        a = a+1
+        while a%n == 0 or a%n == n-2:    # f(x) = x^2+a with a != 0,-2
+            a = a+1
+        yield r.randrange(2,n),a,bound*4**(i//processes)
+
+
+def rho_worker(n,tasks,results,stop):
+    while not stop.is_set():
+        task = tasks.get()
+        if task is None:
+            break
+        x1,a,bound = task
+        results.put(pollard_brent(n,x1,a,bound))
+
+
+def parallel_rho(n,processes,bound=10**6):   # proper divisor of a composite n, None if n is prime (or n < 2)
+    if n < 2 or is_probable_prime(n):
+        return None
+    if n%2 == 0:
+        return 2
+    b,e = is_perfect_power(n)
+    if e > 1:
+        return b
+    walks = rho_walks(n,processes,bound)
+    if processes == 1:
+        g = None
+        while g is None:                 # a failed walk, start the next one
+            x1,a,walk_bound = next(walks)
+            g = pollard_brent(n,x1,a,walk_bound)
+        return g
+    context = multiprocessing.get_context("fork")
+    tasks,results,stop = context.Queue(),context.Queue(),context.Event()
+    for i in range(processes):
+        tasks.put(next(walks))
+    workers = [context.Process(target=rho_worker,args=(n,tasks,results,stop)) for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    g = results.get()
+    while g is None:                     # a failed walk, start the next one
+        tasks.put(next(walks))
+        g = results.get()
+    stop.set()
+    for worker in workers:
+        worker.terminate()
+        worker.join()
+    return g
+
+
+# In[ ]:
+
+
+import time
+for n,bound in [(2**64+1,10**3),(1000000000099987889,10**4),(7000000000282000000000351,10**6)]:
+    for processes in [1,2,4]:
+        strt = time.perf_counter()
+        print(n,processes,parallel_rho(n,processes,bound))
+        end = time.perf_counter()
+        print(f'Time taken = {end-strt}')
+
@@ -20,7 +20,7 @@
 # 
 # To make $f(x_i)= {x_i}^2-n$ small we use $x_i = ( \lfloor \sqrt n \rfloor +r )$ where $r\in [-M,M]$, which is our $sieving\ interval$. 
 # 
-# For negative $f(x_i)$ values we have to include $-1$ in our factor base. Here we take care of sign by calculating absolute value of $f(x_i)'s$.
+# For negative $f(x_i)$ values we have to include $-1$ in our factor base. Here we keep the absolute value of $f(x_i)'s$ and record the sign as the power of $-1$.
 # 
 # Now, for $factor\ base$ we need primes $p$, below some bound $B$, $s.t.$ $n$ is a quadratic residue modulo $p$ as others do not divide any of the $f(x_i)'s$. Hence, we need legendre symbol $\big(\frac{n}{p}\big)$=1.
 # 
@@ -33,42 +33,167 @@
 # In[1]:
 
 
-def jacobi(p,a):   # to check whether 'a' is a  Quadratic Residue modulo p 
+def jacobi(p,a):   # to check whether 'a' is a  Quadratic Residue modulo p, for odd p 
         b=a%p
         c=p
         s=1
-        while b>=2:
-            while b%4==0:
-                b = b/4
-            if b%2 == 0:
-                if c%8==3 or c%8==5:
-                    s = -s
-                b=b/2
-            if b==1:
-                break
+        while b:
+            z = (b & -b).bit_length()-1   # trailing zeros of b
+            b = b>>z
+            if z%2 == 1 and c%8 in (3,5):
+                s = -s
             if b%4==c%4==3:
                 s=-s
-            b1=b
-            b=c%b
-            c=b1
-        return s
+            b,c = c%b,b
+        return s if c == 1 else 0
 
 
-# Below program is to find primes upto $B$ by trial method. While working with large factor base one should replace it with better versions for the same. 
+# Below program finds the primes upto $B$ by a segmented sieve of Eratosthenes: the primes upto $\sqrt B$ cross out their multiples in a bytearray, one segment of $2^{18}$ numbers at a time. Then the Legendre symbols of all of them are computed at once by $jacobi\_many$, which runs the steps of $jacobi$ above on numpy arrays of all the primes together, until every entry is done. A prime dividing $n$ is kept as well, as it divides $f(x)$ whenever it divides $x$ (and $n$ itself, of course).
 
 # In[2]:
 
 
+import math
+import numpy as np
+def mod_many(n,P):         # n mod p for every p in P < 2^31, from 30-bit pieces of n
+    r = np.zeros_like(P)
+    for k in range((n.bit_length()+29)//30-1,-1,-1):
+        r = ((r<<30)+((n>>(30*k)) & (2**30-1)))%P
+    return r
+
+
+def jacobi_many(n,P):      # jacobi(p,n) for every odd p in the array P
+    b = mod_many(n,P)
+    c = P.copy()
+    s = np.ones_like(P)
+    active = b != 0
+    while active.any():
+        z = np.log2(np.where(active,b & -b,1)).astype(np.int64)   # trailing zeros
+        b = b>>z
+        s = np.where((z%2 == 1) & ((c%8 == 3) | (c%8 == 5)),-s,s)
+        s = np.where(active & (b%4 == 3) & (c%4 == 3),-s,s)
+        b,c = np.where(active,c%np.where(active,b,1),0),np.where(active,b,c)
+        active = b != 0
+    return np.where(c == 1,s,0)
+
+
 def primes(B,n):       
-    factor_base = [2]
-    for num in range(3,B + 1):
-        for i in range(2, num):
-            if (num % i) == 0:
+    r = math.isqrt(B)
+    small = bytearray([1])*(r+1)
+    small[:2] = bytes(2)
+    for i in range(2,math.isqrt(r)+1):
+        if small[i]:
+            small[i*i::i] = bytes(len(range(i*i,r+1,i)))
+    sieving_primes = [i for i in range(2,r+1) if small[i]]
+    found = []
+    segment = 1<<18
+    for low in range(2,B+1,segment):   # segment [low, high) of the numbers upto B
+        high = min(low+segment,B+1)
+        block = bytearray([1])*(high-low)
+        for p in sieving_primes:
+            if p*p >= high:
                 break
-        else:
-            if jacobi(num,n) == 1:
-                factor_base.append(num)
-    return factor_base
+            start = max(p*p,(low+p-1)//p*p)
+            block[start-low::p] = bytes(len(range(start,high,p)))
+        found.append(np.frombuffer(bytes(block),dtype=np.uint8).nonzero()[0]+low)
+    P = np.concatenate(found).astype(np.int64)
+    return P[(jacobi_many(n,P) != -1) | (P == 2)].tolist()  # (n/p) = 1 or p | n, and 2 always
+
+
+# ### Choosing a multiplier
+# 
+# Which primes get into the factor base depends only on $n$, and an unlucky $n$ is a non-residue modulo most small primes. Then the $f(x_i)$ are rarely smooth. Instead we can factor $kn$ for a small square-free multiplier $k$: every relation $x^2\equiv y^2\ (mod\ kn)$ also holds modulo $n$. The method of Knuth and Schroeppel scores each $k$ by the expected contribution of the small primes to $\log|f(x)|$:
+# $$
+# F(k)=-\frac12\log k+g(2)+\sum_{p\leq p_{max}} g(p),\ \ \ g(p)=\left\{
+# \begin{array}{rl}
+# \frac{2\log p}{p-1}, & \text{if $\big(\frac{kn}{p}\big)=1$}\\
+# \frac{\log p}{p}, & \text{if $p\mid k$}\\
+# 0, & \text{otherwise}
+# \end{array}\right.
+# $$
+# with $g(2)=2\log 2,\ \log 2,\ \frac12\log 2$ for $kn\equiv 1\ (mod\ 8)$, $kn\equiv 5\ (mod\ 8)$ and $kn\equiv 3\ (mod\ 4)$. The term $-\frac12\log k$ accounts for the values $f(x)$ getting $\sqrt k$ times larger. We take the $k$ with the largest $F(k)$.
+
+# In[ ]:
+
+
+def knuth_schroeppel(n,bound=2000,max_k=100):   # odd square-free multiplier k with the best score F(k)
+    sieve = bytearray([1])*bound
+    sieve[:2] = bytes(2)
+    for i in range(2,math.isqrt(bound)+1):
+        if sieve[i]:
+            sieve[i*i::i] = bytes(len(range(i*i,bound,i)))
+    small = [p for p in range(3,bound) if sieve[p]]
+    best_k,best = 1,None
+    for k in range(1,max_k+1,2):
+        if any(k%(p*p) == 0 for p in small[:5]):
+            continue
+        N = k*n
+        score = -0.5*math.log(k)+math.log(2)*{1: 2,5: 1}.get(N%8,0.5)
+        for p in small:
+            if k%p == 0:
+                score += math.log(p)/p
+            elif pow(N%p,(p-1)//2,p) == 1:
+                score += 2*math.log(p)/(p-1)
+        if best is None or score > best:
+            best_k,best = k,score
+    return best_k
+
+
+# ### Square roots of $n$ modulo the primes of factor base
+# 
+# A prime $p$ of the factor base divides $f(x)=x^2-n$ exactly when $x\equiv \pm t_p\ (mod\ p)$, where $t_p^2\equiv n\ (mod\ p)$. So once we know $t_p$ we know every $x_i$ in the interval that $p$ divides, without any division. Below we compute $t_p$ by the Tonelli-Shanks algorithm: write $p-1=q.2^s$ with $q$ odd, take a non-residue $z$ and keep correcting $r=n^{(q+1)/2}$ by powers of $z^q$ until $r^2\equiv n\ (mod\ p)$.
+
+# In[ ]:
+
+
+def sqrt_mod(n,p):        # Tonelli-Shanks, returns t with t*t = n (mod p) for prime p with (n/p) = 1
+    n = n%p
+    if p == 2 or n == 0:
+        return n
+    if p%4 == 3:
+        return pow(n,(p+1)//4,p)
+    q = p-1
+    s = 0
+    while q%2 == 0:
+        q = q//2
+        s = s+1
+    z = 2
+    while pow(z,(p-1)//2,p) != p-1:  # smallest quadratic non-residue
+        z = z+1
+    c = pow(z,q,p)
+    t = pow(n,q,p)
+    r = pow(n,(q+1)//2,p)
+    while t != 1:
+        i = 0
+        t2 = t
+        while t2 != 1:
+            t2 = t2*t2%p
+            i = i+1
+        b = pow(c,1<<(s-i-1),p)
+        r = r*b%p
+        c = b*b%p
+        t = t*c%p
+        s = i
+    return r
+
+
+# ### Cached roots, logarithms and inverses
+# 
+# Every sieve needs the same numbers for each prime of the factor base: the root $t_p$, $\log_2 p$ for the sieve array, and $(2t_p)^{-1}\ mod\ p$. The last one is all Hensel's lemma needs to lift $t_p$ to $p^2,p^3,...$: as $t_k\equiv t_p\ (mod\ p)$ and $p^k\mid t_k^2-n$, the step $t_{k+1}=t_k-(t_k^2-n)(2t_p)^{-1}$ is correct modulo $p^{k+1}$. We compute them once for each $n$ and factor base and keep them as numpy arrays.
+
+# In[ ]:
+
+
+fb_tables = {}                 # (n, largest prime) -> factor base table, kept between calls
+def factor_base_table(n,factor_base):   # arrays of the primes, roots t_p, log2 p and inverses of 2t_p mod p
+    key = (n,factor_base[-1])
+    if key not in fb_tables:
+        P = np.array(factor_base,dtype=np.int64)
+        t = np.array([sqrt_mod(n,p) for p in factor_base],dtype=np.int64)
+        logp = np.log2(P).astype(np.float32)
+        inverses = np.array([pow(2*int(r),-1,p) if p > 2 and r else 0 for p,r in zip(factor_base,t)],dtype=np.int64)
+        fb_tables[key] = (P,t,logp,inverses)
+    return fb_tables[key]
 
 
 # ### Working with Sieving interval [-M,M]
@@ -87,36 +212,98 @@ def primes(B,n):
 # $$
 # 
 # Below we return lists of the powers corresponding to prime factors for each $f(x_i)$ and,  all $x_i$  and their $f(x_i)$ values.
+# 
+# Trial dividing every $f(x_i)$ by every prime of the factor base costs $O(M.|FB|)$ divisions of large numbers, so we $sieve$ instead. We keep an array with one entry per $x_i$, and for every prime $p$ and each root $\pm t_p$ we add $\log_2 p$ to the entries $x_i\equiv \pm t_p\ (mod\ p)$, which are a stride $p$ apart. Odd prime powers $p^k$ up to the length of the interval are sieved as well, lifting $t_p$ to a root modulo $p^k$ by Hensel's lemma: $t\leftarrow t-(t^2-n)(2t)^{-1}\ (mod\ p^k)$. If $f(x_i)$ factors over the factor base its entry ends up close to $\log_2|f(x_i)|$; the difference comes only from powers of $2$ and the larger prime powers. So we keep the entries above $\log_2|f(x_i)|-T\log_2 p_{max}$ and trial divide only those, and only by the primes whose roots hit $x_i$.
+
+# ### Segmented sieving
+# 
+# For large $M$ an array of $2M+1$ entries does not fit in memory, let alone in cache. So we sieve the interval in blocks of fixed length $L$ (32768 entries of 4 bytes, which stay in L2 cache) one after another. For every prime power $q$ we only carry the offset of its next hit into the following block: after a block of length $L$ an offset $o$ becomes $(o-L)\ mod\ q$. Smooth $f(x_i)$ are yielded as soon as their block is done, so memory use depends on $L$ and the factor base but not on $M$.
+
+# In[ ]:
+
+
+def sieve_setup(n,factor_base,x_start,size):  # roots of x^2 = n mod p, and [q, log p, offsets] for every sieved prime power q
+    roots = []
+    powers = []
+    for p,t,logp,inverse in zip(*(a.tolist() for a in factor_base_table(n,factor_base))):
+        roots.append({t,(p-t)%p})                # a single root when p = 2
+        q = p
+        while True:                              # prime powers p^k up to the interval length
+            powers.append([q,logp,[(root-x_start)%q for root in {t,(q-t)%q}]])
+            q = q*p
+            if p == 2 or q > size or t == 0:
+                break
+            t = (t-(t*t-n)*inverse)%q            # Hensel lifting of the root to p^k
+    return roots,powers
+
+
+def sieve_blocks(n,factor_base,x_start,x_end,T=2,block_size=32768,large_prime_bound=0,double=False): # yields (powers, x, f(x)) for smooth f(x), x_start <= x < x_end
+    roots,powers = sieve_setup(n,factor_base,x_start,x_end-x_start)
+    root_n = math.sqrt(n)
+    slack = T*math.log2(factor_base[-1])
+    if large_prime_bound:                       # room for one or two primes outside the factor base
+        slack += (1+double)*math.log2(large_prime_bound)
+    sieve = np.zeros(block_size,dtype=np.float32)
+    for block_start in range(x_start,x_end,block_size):
+        length = min(block_size,x_end-block_start)
+        sieve[:] = 0
+
+        #....... Sieving log(p) along the roots, carrying offsets to the next block ......
+        for q,logp,offsets in powers:
+            for k in range(len(offsets)):
+                o = offsets[k]
+                if o < length:
+                    sieve[o:length:q] += logp
+                offsets[k] = (o-length)%q
+
+        #....... Keeping x_i with sieve value close to log|f(x_i)| .........
+        xs = np.arange(block_start,block_start+length,dtype=np.float64)
+        log_fx = np.log2(np.abs((xs-root_n)*(xs+root_n))+1)
+        candidates = np.nonzero(sieve[:length] >= log_fx-slack)[0]
+
+        #....... Trial division of the candidates only ...................
+        for j in candidates:
+            i = block_start+int(j)
+            num = abs(i*i-n)
+            if num == 0:
+                continue
+            dic = {"-1": int(i*i < n)}
+            for p,r in zip(factor_base,roots):
+                power = 0
+                if i%p in r:
+                    while num%p == 0:
+                        power += 1
+                        num = num//p
+                dic["{}".format(p)] = power
+            if num == 1:
+                yield dic,i,abs(i*i-n)
+            elif large_prime_bound:
+                large = large_prime_split(num,factor_base[-1],large_prime_bound,double)
+                if large is not None:
+                    for L in large:
+                        dic["{}".format(L)] = dic.get("{}".format(L),0)+1
+                    yield dic,i,abs(i*i-n)
+
 
 # In[3]:
 
 
-import math
-def factoring(B,M,n): # B- Bound for prime factor base, M- sieving interval bound, n- number to be factored
-    power = 0
-    dic = {}
+def factoring(B,M,n,T=2,block_size=32768,large_prime_bound=0,double=False): # B- Bound for prime factor base, M- sieving interval bound, n- number to be factored, T- sieve slack
     list_final=[]
     fx_list=[]
     x_list=[]
-    gif = math.floor(pow(n,1/2))
+    gif = math.isqrt(n)
     factor_base = primes(B,n)
-    for i in range(gif-M,gif+M+1):
-        num = i*i-n
-        for j in factor_base:            # collecting powers of primes of factor base
-            while num%j == 0:
-                power += 1
-                num = num/j
-            dic["{}".format(j)]= power
-            power = 0
-            num = i*i-n
-        
-        number = 1
-        for j in factor_base:             # checking if number factored within our factor base or not
-            number = number*pow(j,dic["{}".format(j)])
-        if number == abs(num):
-            x_list.append(i)
-            fx_list.append(abs(num))
-            list_final.append(dic.copy())
+    relations = sieve_blocks(n,factor_base,gif-M,gif+M+1,T,block_size,large_prime_bound,double)
+    if large_prime_bound:                       # partial relations are combined before they count
+        store = RelationStore(n,factor_base)
+        for relation in relations:
+            store.add(*relation)
+        relations = store.full
+    for dic,x,fx in relations:
+        list_final.append(dic)
+        x_list.append(x)
+        fx_list.append(fx)
     return list_final,x_list,fx_list
 
 
@@ -126,6 +313,26 @@ def factoring(B,M,n): # B- Bound for prime factor base, M- sieving interval boun
 factoring(30,16,9487)
 
 
+# Since relations are streamed, we can sieve a huge interval and stop as soon as we have enough of them; here $M=10^8$ would need a sieve array of $800$ MB.
+
+# In[ ]:
+
+
+import time
+n = 1000000000099987889
+factor_base = primes(1000,n)
+gif = math.isqrt(n)
+strt = time.perf_counter()
+relations = []
+for relation in sieve_blocks(n,factor_base,gif-10**8,gif+10**8+1):
+    relations.append(relation)
+    if len(relations) == len(factor_base)+10:
+        break
+end = time.perf_counter()
+print(len(relations),relations[-1][1:])
+print(f'Time taken = {end-strt}')
+
+
 # In[5]:
 
 
@@ -173,67 +380,342 @@ m.gcd(94+7,8787)
 # 
 # 
 
+# ##### Bit-packed rows, filtering and the whole null space at once
+# 
+# Rows of $M'$ are vectors over $GF(2)$, so we pack each of them into the bits of one integer and adding rows modulo $2$ becomes a single XOR; the row of $A$ that tracks the combination is packed the same way (its $i^{th}$ bit stands for $f(x_i)$). The sign of $f(x_i)$ is the extra column for $-1$.
+# 
+# Before the elimination we shrink the matrix. A column with a single $1$ (a $singleton$) can never be cancelled, so its row is in no dependency and is removed. A column with exactly two $1's$ (a $doubleton$) means a dependency takes either both rows or none, so we replace the two rows by their sum. Removing a row can create new singletons and doubletons, so we repeat until nothing changes.
+# 
+# Then we reduce the rows one by one against pivots kept by their lowest set bit. A row that is not reduced to zero becomes a new pivot; a row that is reduced to zero gives, through its tracking bits, a set of $f(x_i)$ whose product is a square. These sets form a basis of the whole null space, found in one pass, and we try them until one gives a non-trivial divisor.
+
 # In[7]:
 
 
+def gf2_rows(final_list,columns):               # packs the powers modulo 2 of every relation into the bits of an integer
+    rows = []
+    for dic in final_list:
+        row = 0
+        for j,key in enumerate(columns):
+            if dic.get(key,0)%2 == 1:
+                row |= 1<<j
+        rows.append(row)
+    return rows
+
+
+def gf2_filter(rows,history):                   # removes singletons and merges doubletons before elimination
+    rows = list(rows)
+    history = list(history)
+    changed = True
+    while changed:
+        changed = False
+        weight = {}                             # column bit -> rows having it
+        for i,row in enumerate(rows):
+            while row:
+                bit = row & -row
+                weight.setdefault(bit,[]).append(i)
+                row ^= bit
+        dropped = set()
+        touched = set()                         # rows changed in this pass, their columns wait for the next one
+        for bit,which in weight.items():
+            if touched.intersection(which):
+                continue
+            if len(which) == 1:                 # singleton: this row is in no dependency
+                dropped.add(which[0])
+            elif len(which) == 2:               # doubleton: a dependency takes both rows or none
+                a,b = which
+                rows[a] ^= rows[b]
+                history[a] ^= history[b]
+                dropped.add(b)
+            else:
+                continue
+            touched.update(which)
+            changed = True
+        rows = [row for i,row in enumerate(rows) if i not in dropped]
+        history = [h for i,h in enumerate(history) if i not in dropped]
+    return rows,history
+
+
+def gf2_null_space(rows,history):               # every combination of rows adding to zero, as bits of history
+    pivots = {}                                 # lowest set bit -> (row, history)
+    dependencies = []
+    for row,h in zip(rows,history):
+        while row:
+            bit = row & -row
+            if bit not in pivots:
+                pivots[bit] = (row,h)
+                break
+            row ^= pivots[bit][0]
+            h ^= pivots[bit][1]
+        else:
+            dependencies.append(h)
+    return dependencies
+
+
+# ##### Block Lanczos for large sparse matrices
+# 
+# The elimination above still costs about $r^2$ XORs of $r$-bit rows for $r$ relations, and the matrix it fills in is dense. For factor bases of $10^4$-$10^5$ primes we use the block Lanczos method of Montgomery instead. Each relation has only a few odd powers, so we store the matrix $B$ (relations $\times$ primes) in compressed sparse row form: for every relation only the list of its columns, which needs memory proportional to the number of non-zero entries.
+# 
+# Block Lanczos never changes $B$; it only multiplies it with blocks of $64$ vectors at a time, stored as one $64$-bit word per relation, so one XOR works on all $64$ vectors. Starting from a random block $Y$ it builds blocks $V_0=AY,V_1,V_2,...$ that are $A$-orthogonal to each other for the symmetric matrix $A=BB^T$, choosing in each step the largest set of columns $S_i$ for which $V_i^TAV_i$ restricted to $S_i$ is invertible ($W_i^{inv}$). Each new block needs only the last three:
+# 
+# $$
+# V_{i+1}=AV_iS_iS_i^T+V_iD_{i+1}+V_{i-1}E_{i+1}+V_{i-2}F_{i+1}
+# $$
+# 
+# with $64\times 64$ matrices $D,E,F$ made from $W^{inv}$ and the products $V^TAV$, $V^TA^2V$. Meanwhile $X=Y+\sum_i V_iW_i^{inv}V_i^TV_0$ is accumulated. After about $r/63$ steps $V_m^TAV_m=0$, and then the $128$ columns of $X$ and $V_m$ span (most of) a subspace that $B$ sends to $0$. A small elimination on $[BX\ |\ BV_m]$ finds the combinations of columns with $B^Tz=0$, which are up to $64$ dependencies at once.
+
+# In[ ]:
+
+
 import numpy as np
-def qsa(B,M,n):                                  # Bound for factor base, Bound for sieving interval, odd integer to be factored
-    list1 = []
-    final_list,x_values,fx_values = factoring(B,M,n) # vectors list, x-values, f(x) values
-    factor_base = primes(B,n)
-    
-    len_final_list = len(final_list)                 # no. of rows
-    len_factor_base= len(factor_base)                # factor_base length
-    
-    #....... Setting Matrices ..............
-    
-    for i in range(len_final_list):
-        list1.append(list(final_list[i].values()))
-    main_matrix = np.array(list1)                    # Matrix with vectors corresponding to factors powers before modulo 2
-    #................................................
-    working_matrix = (main_matrix.copy()) % 2        # Matrix After modulo 2 calculation
-    tracking_matrix = np.identity(len_final_list)    # Identity matrix for row operations history
-    
-    
-    worked_row_list = []                             # List of row numbers that have been eliminated.
-    for column_no in range(len_factor_base):
-        for row_no in range(len_final_list):
-            if row_no not in worked_row_list:
-                
-                curr_row = working_matrix[row_no,]
-                
-                for row in range(row_no,len_final_list):
-                    if row not in worked_row_list:
-                        if all([i==0 for i in (working_matrix[row,]%2)]): 
-                            
-                            # .............FINAL X VALUE..............
-                            x_value = 1
-                            for i,j in zip(tracking_matrix[row,],x_values):
-                                if i!= 0:
-                                    x_value = (x_value*j)%n
-                                    
-                            #.............FINAL Y VALUE............
-                            y_value = 1
-                            sum_rows=np.zeros((1,len_factor_base))
-                            for i in range(len_final_list):
-                                if tracking_matrix[row,i]==1:
-                                    sum_rows += main_matrix[i,]
-                            for power,factor in zip(sum_rows[0],factor_base):
-                                y_value *= pow(factor,int(power/2),n)
-                                     
-                            # .... Checking if Non-trivial Divisor......       
-                            divisor =  math.gcd(x_value+y_value,n) 
-                            if divisor not in [1,n]:
-                                return "Divisors of {} are = {} and {} ".format(n,divisor,int(n/divisor))
-                                break
-                            
-                #....... Gaussian Elimination..............
-                if working_matrix[row_no,column_no] == 1:
-                    for r in range(row_no+1,len_final_list):
-                        if working_matrix[r,column_no]==1:
-                            working_matrix[r,]=(working_matrix[r,]+curr_row)%2
-                            tracking_matrix[r,]=(tracking_matrix[r,]+ tracking_matrix[row_no,])%2
-                    worked_row_list.append(row_no)
+def gf2_csr(rows):                              # rows as integers -> CSR arrays (indptr, indices) with columns renumbered 0..k-1
+    used = 0
+    for row in rows:
+        used |= row
+    column = {}
+    while used:
+        bit = used & -used
+        column[bit] = len(column)
+        used ^= bit
+    indptr = [0]
+    indices = []
+    for row in rows:
+        while row:
+            bit = row & -row
+            indices.append(column[bit])
+            row ^= bit
+        indptr.append(len(indices))
+    return np.array(indptr,dtype=np.int64),np.array(indices,dtype=np.int64),len(column)
+
+
+def csr_mul(indptr,indices,ncols,V):            # B.V : XOR the words of every relation into its columns
+    out = np.zeros(ncols,dtype=np.uint64)
+    np.bitwise_xor.at(out,indices,np.repeat(V,np.diff(indptr)))
+    return out
+
+
+def csr_mul_transpose(indptr,indices,W):        # B^T.W : XOR of the words of the columns of every relation
+    return np.bitwise_xor.reduceat(W[indices],indptr[:-1])
+
+
+def block_mul(V,m):                             # V (N x 64 block) times 64x64 matrix m, one byte of V at a time
+    out = np.zeros(len(V),dtype=np.uint64)
+    for k in range(8):
+        table = np.zeros(256,dtype=np.uint64)
+        for byte in range(1,256):
+            low = byte & -byte
+            table[byte] = table[byte ^ low] ^ np.uint64(m[8*k+low.bit_length()-1])
+        out ^= table[(V>>np.uint64(8*k)) & np.uint64(255)]
+    return out
+
+
+def block_inner(V,W):                           # V^T.W as 64x64 matrix
+    return [int(np.bitwise_xor.reduce(W[(V>>np.uint64(b)) & np.uint64(1) == 1])) if W.size else 0 for b in range(64)]
+
+
+def mat_mul(a,b):                               # product of 64x64 matrices, rows as integers
+    out = []
+    for row in a:
+        acc = 0
+        while row:
+            low = row & -row
+            acc ^= b[low.bit_length()-1]
+            row ^= low
+        out.append(acc)
+    return out
+
+
+def find_nonsingular_sub(t,last_s):             # W_inv and the columns S for which S^T t S is invertible
+    M = [[t[i],1<<i] for i in range(64)]
+    s = [i for i in range(64) if i not in last_s]+list(last_s)
+    chosen = []
+    for i in range(64):
+        mask = 1<<s[i]
+        for half in (0,1):                      # a pivot in t if possible, else in the identity half
+            for j in range(i,64):
+                if M[s[j]][half] & mask:
+                    M[s[i]],M[s[j]] = M[s[j]],M[s[i]]
+                    break
+            else:
+                if half == 1:
+                    return None,None
+                continue
+            pivot = M[s[i]]
+            for k in range(64):
+                if k != s[i] and M[k][half] & mask:
+                    M[k] = [M[k][0]^pivot[0],M[k][1]^pivot[1]]
+            if half == 0:
+                chosen.append(s[i])
+            else:
+                M[s[i]] = [0,0]
+            break
+    if len(set(chosen)|set(last_s)) != 64:
+        return None,None
+    return [M[i][1] for i in range(64)],chosen
+
+
+def block_lanczos(indptr,indices,ncols,seed=None):  # 64 vectors x, v with B.x and B.v mostly 0
+    nrows = len(indptr)-1
+    rng = np.random.default_rng(seed)
+    def A_mul(V):
+        return csr_mul_transpose(indptr,indices,csr_mul(indptr,indices,ncols,V))
+    x = rng.integers(0,2**63,size=nrows,dtype=np.uint64)*np.uint64(2)+rng.integers(0,2,size=nrows,dtype=np.uint64)
+    v0 = A_mul(x)
+    zero = np.zeros(nrows,dtype=np.uint64)
+    v = [v0.copy(),zero,zero]
+    winv = [[0]*64,[0]*64,[0]*64]
+    vt_a_v = [[0]*64,[0]*64]
+    vt_a2_v = [[0]*64,[0]*64]
+    s1 = list(range(64))
+    mask1 = (1<<64)-1
+    for iteration in range(nrows//60+50):
+        vnext = A_mul(v[0])
+        vt_a_v[0] = block_inner(v[0],vnext)
+        vt_a2_v[0] = block_inner(vnext,vnext)
+        if not any(vt_a_v[0]):
+            break
+        winv[0],s0 = find_nonsingular_sub(vt_a_v[0],s1)
+        if winv[0] is None:
+            return None
+        mask0 = 0
+        for c in s0:
+            mask0 |= 1<<c
+        d = mat_mul(winv[0],[(vt_a2_v[0][i] & mask0)^vt_a_v[0][i] for i in range(64)])
+        d = [d[i]^(1<<i) for i in range(64)]
+        e = [row & mask0 for row in mat_mul(winv[1],vt_a_v[0])]
+        f = mat_mul(vt_a_v[1],winv[1])
+        f = mat_mul(winv[2],[f[i]^(1<<i) for i in range(64)])
+        f = mat_mul(f,[((vt_a2_v[1][i] & mask1)^vt_a_v[1][i]) & mask0 for i in range(64)])
+        vnext = (vnext & np.uint64(mask0))^block_mul(v[0],d)^block_mul(v[1],e)^block_mul(v[2],f)
+        x ^= block_mul(v[0],mat_mul(winv[0],block_inner(v[0],v0)))
+        v = [vnext,v[0],v[1]]
+        winv = [[0]*64,winv[0],winv[1]]
+        vt_a_v = [[0]*64,vt_a_v[0]]
+        vt_a2_v = [[0]*64,vt_a2_v[0]]
+        s1 = s0
+        mask1 = mask0
+    else:
+        return None
+    return x,v[0]
+
+
+def bits_of_words(W,b):                         # bit b of every word of W as one integer
+    return int.from_bytes(np.packbits(((W>>np.uint64(b)) & np.uint64(1)).astype(np.uint8),bitorder='little').tobytes(),'little')
+
+
+def lanczos_null_space(rows,history,seed=None):  # same result as gf2_null_space, through block Lanczos on the sparse matrix
+    dependencies = [h for row,h in zip(rows,history) if row == 0]
+    history = [h for row,h in zip(rows,history) if row != 0]
+    rows = [row for row in rows if row != 0]
+    if not rows:
+        return dependencies
+    indptr,indices,ncols = gf2_csr(rows)
+    for attempt in range(5):
+        result = block_lanczos(indptr,indices,ncols,None if seed is None else seed+attempt)
+        if result is not None:
+            break
+    else:
+        return dependencies
+    x,v = result
+    bx = csr_mul(indptr,indices,ncols,x)
+    bv = csr_mul(indptr,indices,ncols,v)
+
+    #....... Combining the columns of x and v into vectors with B.z = 0 .......
+    pivots = {}
+    for W,BW in ((x,bx),(v,bv)):
+        for b in range(64):
+            image,z = bits_of_words(BW,b),bits_of_words(W,b)
+            while image:
+                low = image & -image
+                if low not in pivots:
+                    pivots[low] = (image,z)
+                    break
+                image ^= pivots[low][0]
+                z ^= pivots[low][1]
+            else:
+                #....... z picks filtered rows, history maps them back to relations .......
+                h = 0
+                while z:
+                    low = z & -z
+                    h ^= history[low.bit_length()-1]
+                    z ^= low
+                if h:
+                    dependencies.append(h)
+    return dependencies
+
+
+# ##### Finding the divisor
+# 
+# Both $gf2\_null\_space$ and $lanczos\_null\_space$ return the dependencies in the same form, so the backend is a parameter.
+# 
+# A perfect power $n=b^e$ is not split by $x^2\equiv y^2$ (for $e=2$ there is no factor base at all, since $n$ is a square modulo every $p$), so $b$ is returned first. $is\_perfect\_power$ tries $\lfloor n^{1/k}\rfloor$ for the primes $k\leq\log_2 n$, with Newton's method on integers.
+
+# In[ ]:
+
+
+def iroot(x,k):                          # floor of the k-th root of x >= 0, with integers only
+    if x < 2:
+        return x
+    r = 1<<-(-x.bit_length()//k)         # r^k > x
+    while True:
+        s = ((k-1)*r+x//r**(k-1))//k     # Newton step
+        if s >= r:
+            return r
+        r = s
+
+
+def is_perfect_power(n):                 # (b, e) with n = b^e and e largest, e = 1 if n is no power (0 = 0^2, 1 = 1^2)
+    if n < 2:
+        return n,2
+    for k in range(2,n.bit_length()+1):
+        if all(k%j for j in range(2,math.isqrt(k)+1)):   # prime k only
+            b = iroot(n,k)
+            if b**k == n:
+                b,e = is_perfect_power(b)
+                return b,e*k
+    return n,1
+
+
+def find_divisor(final_list,x_values,factor_base,n,linear_algebra="gauss"): # vectors list, x-values, factor base, number to be factored, "gauss" or "lanczos"
+    columns = ["-1"]+["{}".format(p) for p in factor_base]
+    rows = gf2_rows(final_list,columns)
+    rows,history = gf2_filter(rows,[1<<i for i in range(len(rows))])
+    if linear_algebra == "lanczos":
+        dependencies = lanczos_null_space(rows,history)
+    else:
+        dependencies = gf2_null_space(rows,history)
+    for dependency in dependencies:
+        chosen = [i for i in range(len(final_list)) if dependency>>i & 1]
+
+        # .............FINAL X VALUE..............
+        x_value = 1
+        for i in chosen:
+            x_value = x_value*x_values[i]%n
+
+        #.............FINAL Y VALUE............
+        powers = {}
+        for i in chosen:
+            for key,power in final_list[i].items():
+                powers[key] = powers.get(key,0)+power
+        y_value = 1
+        for key,power in powers.items():
+            if key != "-1":
+                y_value = y_value*pow(int(key),power//2,n)%n
+
+        # .... Checking if Non-trivial Divisor......
+        divisor = math.gcd(x_value+y_value,n)
+        if divisor not in [1,n]:
+            return divisor
+
+def qsa(B,M,n,linear_algebra="gauss",multiplier=1):           # Bound for factor base, Bound for sieving interval, odd integer to be factored, k (None to choose)
+    b,e = is_perfect_power(n)
+    if e > 1:
+        return "Divisors of {} are = {} and {} ".format(n,b,n//b)
+    k = knuth_schroeppel(n) if multiplier is None else multiplier
+    final_list,x_values,fx_values = factoring(B,M,k*n) # vectors list, x-values, f(x) values
+    factor_base = primes(B,k*n)
+    divisor = find_divisor(final_list,x_values,factor_base,n,linear_algebra)
+    if divisor is not None:
+        return "Divisors of {} are = {} and {} ".format(n,divisor,n//divisor)
 
 
 # In[8]:
@@ -261,3 +743,600 @@ print(f'Time taken = {end-strt}')
 
 print(qsa(1000,100000,1000000000099987889))
 
+
+# ## Self-Initializing Quadratic Sieve (SIQS)
+# 
+# With the single polynomial $f(x)=x^2-n$ the values $|f(x)|\approx 2M\sqrt n$ grow with $M$, so the yield of smooth values drops as the interval grows, and a bigger $M$ is the only way to get more relations. Instead we use many polynomials
+# 
+# $$
+# (Ax+B)^2-n = A(Ax^2+2Bx+C) = A.g(x),\qquad B^2\equiv n\ (mod\ A),\ C=\frac{B^2-n}{A}
+# $$
+# 
+# each sieved over a small interval $x\in[-M,M)$. Taking $A\approx \sqrt{2n}/M$ keeps $|g(x)|\leq M\sqrt{n/2}$ over the whole interval. We take $A=q_1q_2...q_s$, a product of primes of the factor base, so $A.g(x)$ factors over the factor base whenever $g(x)$ does, and $u^2\equiv A.g(x)\ (mod\ n)$ with $u=Ax+B$ is a relation exactly like before. We keep $s\geq 2$ whenever the factor base allows it, since $s=1$ leaves a single choice of $A$; once no unused $A$ is found the relation generator simply stops.
+# 
+# For such $A$ there are $2^{s}$ solutions of $B^2\equiv n\ (mod\ A)$, namely $B=\pm B_1\pm B_2...\pm B_s$ with $B_l=\frac{A}{q_l}\big(t_{q_l}(\frac{A}{q_l})^{-1}\ mod\ q_l\big)$, giving $2^{s-1}$ polynomials up to sign. The roots of $g(x)$ modulo $p$ are $x\equiv A^{-1}(\pm t_p-B)\ (mod\ p)$. Walking through the signs in Gray code order changes one $B_l$ at a time, $B\leftarrow B+2eB_l$, and then every root just moves by $-e.2B_lA^{-1}\ (mod\ p)$, which we precompute once per $A$. So switching to the next polynomial costs one subtraction per prime, and we do not need any new modular inverse until we run out of polynomials for this $A$.
+
+# In[ ]:
+
+
+import random
+def siqs_polynomial_a(n,factor_base,M,used):  # A = q_1*q_2*...*q_s close to sqrt(2n)/M, q_j from factor base
+    target = max(math.isqrt(2*n)//M,3)
+    pool = [p for p in factor_base if p > 3 and n%p != 0]
+    if not pool:
+        return None
+    s = max(2 if len(pool) > 2 else 1,math.ceil(math.log(target)/math.log(pool[len(pool)*2//3])))   # s = 1 would give a single A
+    if s > len(pool):                           # too few primes for A
+        return None
+    q_size = target**(1/s)
+    window = [p for p in pool if q_size/2 <= p <= 2*q_size]
+    if len(window) < s+1:
+        window = pool
+    for attempt in range(100):
+        q = random.sample(window,s-1)
+        rest = target//math.prod(q)
+        last = min((p for p in pool if p not in q),key=lambda p: abs(p-rest))   # best last prime
+        A = math.prod(q)*last
+        if A not in used:
+            used.add(A)
+            return A,sorted(q+[last])
+    return None                                 # no unused A found
+
+
+def siqs_relations(n,factor_base,M,T=2,large_prime_bound=0,double=False,used=None): # yields (powers, u, |u^2-n|) for smooth values of (Ax+B)^2-n, -M <= x < M
+    P,t,logp,inverses = factor_base_table(n,factor_base)
+    logp = logp.tolist()
+    threshold = math.log2(M*math.isqrt(n//2))-T*math.log2(factor_base[-1])
+    if large_prime_bound:                       # room for one or two primes outside the factor base
+        threshold -= (1+double)*math.log2(large_prime_bound)
+    sieve = np.zeros(2*M,dtype=np.float32)
+    used = set() if used is None else used     # values of A not to be used again
+    while True:
+        #....... New A and its B_l values, inverses and root steps ...........
+        polynomial = siqs_polynomial_a(n,factor_base,M,used)
+        if polynomial is None:                  # every A has been used
+            return
+        A,q = polynomial
+        q_index = [factor_base.index(ql) for ql in q]
+        B_list = []
+        for ql,i in zip(q,q_index):
+            gamma = int(t[i])*pow(A//ql,-1,ql)%ql
+            if gamma > ql//2:
+                gamma = ql-gamma
+            B_list.append(A//ql*gamma)
+        ainv = np.array([pow(A,-1,p) if A%p else 0 for p in factor_base],dtype=np.int64)
+        Bainv2 = [np.array([2*Bl%p for p in factor_base],dtype=np.int64)*ainv%P for Bl in B_list]
+        B = sum(B_list)
+        B_mod = np.array([B%p for p in factor_base],dtype=np.int64)
+        soln1 = ainv*((t-B_mod)%P)%P
+        soln2 = ainv*((-t-B_mod)%P)%P
+        sieve_index = [i for i in range(len(factor_base)) if i not in q_index]
+        signs = [1]*len(q)
+
+        for poly in range(2**(len(q)-1)):
+            #....... Next polynomial in Gray code order ...........
+            if poly:
+                v = (poly & -poly).bit_length()    # sign of B_v changes
+                signs[v] = -signs[v]
+                B = B+2*signs[v]*B_list[v]
+                soln1 = (soln1-signs[v]*Bainv2[v])%P
+                soln2 = (soln2-signs[v]*Bainv2[v])%P
+            C = (B*B-n)//A
+            offset1 = (soln1+M)%P
+            offset2 = (soln2+M)%P
+
+            #....... Sieving g(x) over [-M,M) ...........
+            sieve[:] = 0
+            for i in sieve_index:
+                p = factor_base[i]
+                sieve[offset1[i]::p] += logp[i]
+                if offset2[i] != offset1[i]:
+                    sieve[offset2[i]::p] += logp[i]
+
+            #....... Trial division of the candidates only ...........
+            for j in np.nonzero(sieve >= threshold)[0]:
+                hits = np.nonzero(((j-offset1)%P == 0) | ((j-offset2)%P == 0))[0]
+                x = int(j)-M
+                num = abs(A*x*x+2*B*x+C)
+                if num == 0:
+                    continue
+                u = A*x+B
+                found = {i: 1 for i in q_index}
+                for i in set(hits.tolist())|set(q_index):
+                    p = factor_base[i]
+                    while num%p == 0:
+                        found[i] = found.get(i,0)+1
+                        num = num//p
+                large = ()
+                if num > 1:
+                    if not large_prime_bound:
+                        continue
+                    large = large_prime_split(num,factor_base[-1],large_prime_bound,double)
+                    if large is None:
+                        continue
+                dic = {"-1": int(u*u < n)}        # only the primes that divide, missing keys are 0
+                for i,power in found.items():
+                    dic["{}".format(factor_base[i])] = power
+                for L in large:
+                    dic["{}".format(L)] = dic.get("{}".format(L),0)+1
+                yield dic,u,abs(u*u-n)
+
+
+# In[ ]:
+
+
+def siqs_divisor(B,M,n,T=None,linear_algebra="gauss",large_prime_bound=None,double=False,multiplier=None):  # Bound for factor base, half length of interval for each polynomial, odd integer to be factored
+    b,e = is_perfect_power(n)
+    if e > 1:
+        return b
+    k = knuth_schroeppel(n) if multiplier is None else multiplier
+    factor_base = primes(B,k*n)
+    if large_prime_bound is None:
+        large_prime_bound = 64*factor_base[-1]
+    if T is None:                               # the large primes already make room in the threshold
+        T = 2 if not large_prime_bound else -0.5 if double else 0.5
+    store = RelationStore(k*n,factor_base)
+    seen = set()
+    for dic,u,fx in siqs_relations(k*n,factor_base,M,T,large_prime_bound,double):
+        if abs(u) in seen:                     # the same relation from another polynomial
+            continue
+        seen.add(abs(u))
+        store.add(dic,u,fx)
+        if len(store.full) >= len(factor_base)+10:
+            break
+    final_list = [dic for dic,u,fx in store.full]
+    x_values = [u for dic,u,fx in store.full]
+    return find_divisor(final_list,x_values,factor_base,n,linear_algebra)
+
+def siqs(B,M,n,T=None,linear_algebra="gauss",large_prime_bound=None,double=False,multiplier=None):
+    divisor = siqs_divisor(B,M,n,T,linear_algebra,large_prime_bound,double,multiplier)
+    if divisor is not None:
+        return "Divisors of {} are = {} and {} ".format(n,divisor,n//divisor)
+
+
+# In[ ]:
+
+
+import time
+strt = time.perf_counter()
+print(siqs(1000,10000,1000000000099987889))
+end = time.perf_counter()
+print(f'Time taken = {end-strt}')
+
+
+# In[ ]:
+
+
+import time
+strt = time.perf_counter()
+print(siqs(2000,20000,7000000000282000000000351))
+end = time.perf_counter()
+print(f'Time taken = {end-strt}')
+
+
+# ### Gaussian elimination vs Block Lanczos on the same relations
+# 
+# We collect one set of relations and give the same filtered matrix to both backends. Every dependency must make all powers even, and both must lead to a divisor.
+
+# In[ ]:
+
+
+import time
+n = 150000000000061600000000005073
+factor_base = primes(8000,n)
+final_list,x_values = [],[]
+seen = set()
+for dic,u,fx in siqs_relations(n,factor_base,32768):
+    if abs(u) not in seen:
+        seen.add(abs(u))
+        final_list.append(dic)
+        x_values.append(u)
+    if len(final_list) >= len(factor_base)+70:
+        break
+columns = ["-1"]+["{}".format(p) for p in factor_base]
+rows,history = gf2_filter(gf2_rows(final_list,columns),[1<<i for i in range(len(final_list))])
+for name,null_space in [("gauss",gf2_null_space),("lanczos",lanczos_null_space)]:
+    strt = time.perf_counter()
+    dependencies = null_space(rows,history)
+    end = time.perf_counter()
+    squares = all(sum(final_list[i].get(key,0) for i in range(len(final_list)) if d>>i & 1)%2 == 0 for d in dependencies for key in columns)
+    print(name,len(dependencies),"dependencies, all squares:",squares,f'Time taken = {end-strt}')
+    print(find_divisor(final_list,x_values,factor_base,n,name))
+
+
+# ## Large Prime Variation
+# 
+# Most of the candidates that survive the sieve are not smooth: after dividing out the factor base a cofactor $c>1$ is left. If $p_{max}<c<L$ for a bound $L\leq p_{max}^2$, then $c$ is a single $large\ prime$. Such a $partial$ relation is useless by itself, but two partial relations with the same large prime $c$ multiply to $u_1^2u_2^2\equiv f_1f_2$ where $f_1f_2$ is smooth times $c^2$, which is as good as a full relation ($c$ goes into $y$ and not into the matrix).
+# 
+# With the $double$ large prime variation we also keep cofactors $c=c_1c_2<L^2$ with two primes $c_1,c_2<L$, split by Pollard rho. Then we think of the large primes as vertices of a graph (with an extra vertex $1$ for the single large prime relations) and of every partial relation as an edge between its two large primes. Any cycle in this graph gives a set of relations in which every large prime appears an even number of times, so their product is again a full relation. We keep a spanning forest with union-find: a new edge inside one tree closes exactly one cycle, made of the new edge and the path between its ends in the tree.
+
+# In[ ]:
+
+
+def large_prime_split(c,pmax,L,double):       # cofactor left after trial division -> tuple of its large primes, or None
+    L = min(L,pmax*pmax)                        # below p_max^2 a cofactor is prime
+    if c < L:
+        return (c,)
+    if not double or c >= L*L or pow(2,c-1,c) == 1:
+        return None
+    x = y = 2
+    a = 1
+    d = 1
+    while d == 1:                               # Pollard rho on the small composite c
+        x = (x*x+a)%c
+        y = (y*y+a)%c
+        y = (y*y+a)%c
+        d = math.gcd(x-y,c)
+        if d == c:
+            a = a+1
+            x = y = 2
+            d = 1
+    c1,c2 = sorted((d,c//d))
+    if c2 < L and pow(2,c1-1,c1) == 1 and pow(2,c2-1,c2) == 1:
+        return (c1,c2)
+
+
+class RelationStore:                            # full relations, and partial ones combined along cycles of large primes
+    def __init__(self,n,factor_base):
+        self.n = n
+        self.keys = {"-1"}|{"{}".format(p) for p in factor_base}
+        self.full = []                          # (powers, u, |f|)
+        self.component = {}                     # union-find over the large primes, 1 for single large primes
+        self.tree = {}                          # large prime -> (parent, relation) in the spanning forest
+        self.partial = 0
+
+    def find(self,a):
+        while self.component.get(a,a) != a:
+            self.component[a] = self.component.get(self.component[a],self.component[a])
+            a = self.component[a]
+        return a
+
+    def reroot(self,a):                         # makes a the root of its tree
+        vertex,edge = a,None
+        while True:
+            up = self.tree.pop(vertex,None)
+            if edge is not None:
+                self.tree[vertex] = edge
+            if up is None:
+                return
+            edge = (vertex,up[1])
+            vertex = up[0]
+
+    def path(self,a,b):                         # relations on the tree path from a to b
+        side_a = {a: 0}
+        relations = []
+        while a in self.tree:
+            a,relation = self.tree[a]
+            relations.append(relation)
+            side_a[a] = len(relations)
+        side_b = []
+        while b not in side_a:
+            b,relation = self.tree[b]
+            side_b.append(relation)
+        return side_b+relations[:side_a[b]]
+
+    def add(self,dic,u,fx):                     # True when a new full relation is found
+        large = [int(key) for key,power in dic.items() if key not in self.keys for i in range(power)]
+        if not large:
+            self.full.append((dic,u,fx))
+            return True
+        a,b = (1,large[0]) if len(large) == 1 else large
+        root_a,root_b = self.find(a),self.find(b)
+        if root_a != root_b:
+            self.component[root_a] = root_b
+            self.reroot(a)
+            self.tree[a] = (b,(dic,u,fx))
+            self.partial += 1
+            return False
+        x = u%self.n
+        f = fx
+        powers = dict(dic)
+        for d,v,g in self.path(a,b):            # the cycle closed by this relation
+            x = x*v%self.n
+            f = f*g
+            for key,power in d.items():
+                powers[key] = powers.get(key,0)+power
+        self.full.append((powers,x,f))
+        return True
+
+
+# In[ ]:
+
+
+n = 210000000000000017600000000000000363
+for large_prime_bound,double in [(0,False),(None,False),(None,True)]:
+    strt = time.perf_counter()
+    print(siqs(20000,65536,n,large_prime_bound=large_prime_bound,double=double))
+    end = time.perf_counter()
+    print(large_prime_bound,double,f'Time taken = {end-strt}')
+
+
+# ## Sieving on several processes
+# 
+# Sieving different blocks of the interval, or different polynomials, are independent of each other, so we can give them to several processes. The factor base table ($p$, $t_p$ and $(2t_p)^{-1}$) is written once into shared memory, and every worker maps it instead of getting its own copy. Workers take tasks from a queue (a block of the interval for the QS, a random seed for a stream of SIQS polynomials) and send their relations back in batches, keeping only the non-zero powers. The collector merges them (removing duplicates and combining large primes) and tells the workers to stop as soon as it has enough relations.
+
+# In[ ]:
+
+
+import multiprocessing
+from multiprocessing import shared_memory
+def relation_worker(shm_name,shape,n,M,T,block_size,large_prime_bound,double,tasks,results,stop):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    P,t,inverses = np.ndarray(shape,dtype=np.int64,buffer=shm.buf)
+    factor_base = P.tolist()
+    fb_tables[(n,factor_base[-1])] = (P,t,np.log2(P).astype(np.float32),inverses)
+    while not stop.is_set():
+        task = tasks.get()
+        if task is None:
+            break
+        if task[0] == "blocks":
+            relations = sieve_blocks(n,factor_base,task[1],task[2],T,block_size,large_prime_bound,double)
+        else:
+            random.seed(task[1])                  # different polynomials in every worker
+            relations = siqs_relations(n,factor_base,M,T,large_prime_bound,double)
+        batch = []
+        for dic,u,fx in relations:
+            batch.append((u,[(key,power) for key,power in dic.items() if power]))
+            if len(batch) == 32:
+                results.put(batch)
+                batch = []
+            if stop.is_set():
+                break
+        results.put(batch)
+        results.put(None)                         # task done
+
+
+def parallel_relations(n,factor_base,tasks,wanted,processes,M=0,T=2,block_size=32768,large_prime_bound=0,double=False):
+    context = multiprocessing.get_context("fork")
+    P,t,logp,inverses = factor_base_table(n,factor_base)
+    shm = shared_memory.SharedMemory(create=True,size=3*P.nbytes)
+    table = np.ndarray((3,len(P)),dtype=np.int64,buffer=shm.buf)
+    table[:] = [P,t,inverses]
+    task_queue,results,stop = context.Queue(),context.Queue(),context.Event()
+    for task in tasks:
+        task_queue.put(task)
+    for i in range(processes):
+        task_queue.put(None)
+    workers = [context.Process(target=relation_worker,args=(shm.name,table.shape,n,M,T,block_size,large_prime_bound,double,task_queue,results,stop)) for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    store = RelationStore(n,factor_base)
+    seen = set()
+    running = len(tasks)
+    while running and len(store.full) < wanted:
+        batch = results.get()
+        if batch is None:
+            running = running-1
+            continue
+        for u,powers in batch:
+            if abs(u) not in seen:
+                seen.add(abs(u))
+                store.add(dict(powers),u,abs(u*u-n))
+    stop.set()
+    for worker in workers:
+        worker.terminate()
+        worker.join()
+    del table
+    shm.close()
+    shm.unlink()
+    return store.full
+
+
+def parallel_factoring(B,M,n,processes,T=2,block_size=32768,large_prime_bound=0,double=False): # factoring() with the blocks shared out among processes
+    gif = math.isqrt(n)
+    factor_base = primes(B,n)
+    tasks = [("blocks",x,min(x+block_size,gif+M+1)) for x in range(gif-M,gif+M+1,block_size)]
+    full = parallel_relations(n,factor_base,tasks,math.inf,processes,0,T,block_size,large_prime_bound,double)
+    return [dic for dic,x,fx in full],[x for dic,x,fx in full],[fx for dic,x,fx in full]
+
+
+def parallel_siqs(B,M,n,processes,T=None,linear_algebra="gauss",large_prime_bound=None,double=False,multiplier=None): # siqs() with the polynomials shared out among processes
+    b,e = is_perfect_power(n)
+    if e > 1:
+        return "Divisors of {} are = {} and {} ".format(n,b,n//b)
+    k = knuth_schroeppel(n) if multiplier is None else multiplier
+    factor_base = primes(B,k*n)
+    if large_prime_bound is None:
+        large_prime_bound = 64*factor_base[-1]
+    if T is None:
+        T = 2 if not large_prime_bound else -0.5 if double else 0.5
+    tasks = [("siqs",random.randrange(2**32)) for i in range(processes)]
+    full = parallel_relations(k*n,factor_base,tasks,len(factor_base)+10,processes,M,T,0,large_prime_bound,double)
+    divisor = find_divisor([dic for dic,u,fx in full],[u for dic,u,fx in full],factor_base,n,linear_algebra)
+    if divisor is not None:
+        return "Divisors of {} are = {} and {} ".format(n,divisor,n//divisor)
+
+
+# In[ ]:
+
+
+n = 1000000000099987889
+for processes in [1,2,4]:
+    strt = time.perf_counter()
+    final_list,x_values,fx_values = parallel_factoring(1000,100000,n,processes)
+    print(processes,len(final_list),find_divisor(final_list,x_values,primes(1000,n),n))
+    end = time.perf_counter()
+    print(f'Time taken = {end-strt}')
+
+
+# In[ ]:
+
+
+n = 210000000000000017600000000000000363
+for processes in [1,2,4]:
+    strt = time.perf_counter()
+    print(parallel_siqs(20000,65536,n,processes))
+    end = time.perf_counter()
+    print(processes,f'Time taken = {end-strt}')
+
+
+# ## Checkpoints
+# 
+# A long run keeps all its relations in memory, so if the process dies everything is lost. Instead we append every relation to a file as soon as it is found, together with the progress: the next block of the interval for the QS, or the values of $A$ already used for the SIQS. The file is plain text, one record per line:
+# 
+# $h$ (method, $n$, $B$, $M$), $f$ (the factor base), $r$ ($u$ and the non-zero powers $key$^$power$ of a relation), $b$ (the interval is done upto this $x$), $a$ (this $A$ was used).
+# 
+# Lines are only ever appended, and a line cut off by a crash is dropped when the file is read again. For the QS the relations after the last $b$ line are dropped too, since that part of the interval is sieved again and would otherwise give every relation twice (and trivial dependencies). $resume(path)$ reads the file and continues the run from where it stopped.
+
+# In[ ]:
+
+
+import os
+def read_checkpoint(path):        # header, factor base, relations (powers, u), next x, used A values
+    header,factor_base,relations,x,used = None,[],[],None,set()
+    with open(path) as file:
+        text = file.read()
+    for line in text[:text.rfind("\n")+1].splitlines():   # only complete lines
+        kind,*fields = line.split()
+        if kind == "h":
+            header = (fields[0],int(fields[1]),int(fields[2]),int(fields[3]))
+        elif kind == "f":
+            factor_base = [int(p) for p in fields]
+        elif kind == "r":
+            relations.append(({key: int(power) for key,power in (field.split("^") for field in fields[1:])},int(fields[0])))
+        elif kind == "b":
+            x = int(fields[0])
+        elif kind == "a":
+            used.add(int(fields[0]))
+    return header,factor_base,relations,x,used
+
+
+def open_checkpoint(path,method,B,M,n,factor_base):  # appends to path, writing the header for a new file
+    if os.path.exists(path):
+        with open(path,"rb+") as file:            # drop a line cut off by a crash
+            lines = file.read().splitlines(keepends=True)
+            if lines and not lines[-1].endswith(b"\n"):
+                lines.pop()
+            if method == "qs":                    # and the relations after the last finished block, it is sieved again
+                last = max([i for i,line in enumerate(lines) if line[:2] in (b"f ",b"b ")],default=-1)
+                lines = lines[:last+1]
+            file.truncate(sum(len(line) for line in lines))
+        return open(path,"a")
+    file = open(path,"a")
+    file.write("h {} {} {} {}\n".format(method,n,B,M))
+    file.write("f "+" ".join(str(p) for p in factor_base)+"\n")
+    file.flush()
+    return file
+
+
+def write_relation(file,dic,u):
+    file.write("r {} ".format(u)+" ".join("{}^{}".format(key,power) for key,power in dic.items() if power)+"\n")
+
+
+def qsa_checkpoint(B,M,n,path,linear_algebra="gauss",chunk=1<<19,T=2):  # qsa() saving its progress to path every chunk of the interval
+    b,e = is_perfect_power(n)
+    if e > 1:
+        return "Divisors of {} are = {} and {} ".format(n,b,n//b)
+    gif = math.isqrt(n)
+    factor_base = primes(B,n)
+    x = gif-M
+    final_list,x_values = [],[]
+    if os.path.exists(path):
+        header,factor_base,relations,x_done,used = read_checkpoint(path)
+        if header != ("qs",n,B,M):
+            raise ValueError("checkpoint {} is for {}".format(path,header))
+        x = x_done if x_done is not None else x
+        relations = [(dic,u) for dic,u in relations if u < x]   # the rest is sieved again, open_checkpoint drops it from the file
+        final_list = [dic for dic,u in relations]
+        x_values = [u for dic,u in relations]
+    with open_checkpoint(path,"qs",B,M,n,factor_base) as file:
+        while x < gif+M+1:
+            end = min(x+chunk,gif+M+1)
+            for dic,u,fx in sieve_blocks(n,factor_base,x,end,T):
+                write_relation(file,dic,u)
+                final_list.append(dic)
+                x_values.append(u)
+            file.write("b {}\n".format(end))       # everything before end is saved
+            file.flush()
+            os.fsync(file.fileno())
+            x = end
+    divisor = find_divisor(final_list,x_values,factor_base,n,linear_algebra)
+    if divisor is not None:
+        return "Divisors of {} are = {} and {} ".format(n,divisor,n//divisor)
+
+
+def siqs_checkpoint(B,M,n,path,linear_algebra="gauss",large_prime_bound=None,T=None):  # siqs() saving its relations and used A values to path
+    b,e = is_perfect_power(n)
+    if e > 1:
+        return "Divisors of {} are = {} and {} ".format(n,b,n//b)
+    factor_base = primes(B,n)
+    used = set()
+    relations = []
+    if os.path.exists(path):
+        header,factor_base,relations,x_done,used = read_checkpoint(path)
+        if header != ("siqs",n,B,M):
+            raise ValueError("checkpoint {} is for {}".format(path,header))
+    if large_prime_bound is None:
+        large_prime_bound = 64*factor_base[-1]
+    if T is None:
+        T = 2 if not large_prime_bound else 0.5
+    store = RelationStore(n,factor_base)
+    seen = set()
+    for dic,u in relations:
+        seen.add(abs(u))
+        store.add(dic,u,abs(u*u-n))
+    written = set(used)
+    with open_checkpoint(path,"siqs",B,M,n,factor_base) as file:
+        for dic,u,fx in siqs_relations(n,factor_base,M,T,large_prime_bound,False,used):
+            for A in used-written:                # polynomials started since the last relation
+                file.write("a {}\n".format(A))
+            written |= used
+            if len(store.full) >= len(factor_base)+10:
+                break
+            if abs(u) in seen:
+                continue
+            seen.add(abs(u))
+            write_relation(file,dic,u)
+            file.flush()
+            store.add(dic,u,fx)
+    final_list = [dic for dic,u,fx in store.full]
+    x_values = [u for dic,u,fx in store.full]
+    divisor = find_divisor(final_list,x_values,factor_base,n,linear_algebra)
+    if divisor is not None:
+        return "Divisors of {} are = {} and {} ".format(n,divisor,n//divisor)
+
+
+def resume(path,linear_algebra="gauss"):    # continues the run saved in path
+    method,n,B,M = read_checkpoint(path)[0]
+    if method == "qs":
+        return qsa_checkpoint(B,M,n,path,linear_algebra)
+    return siqs_checkpoint(B,M,n,path,linear_algebra)
+
+
+# In[ ]:
+
+
+import tempfile
+n = 150000000000061600000000005073
+path = os.path.join(tempfile.mkdtemp(),"siqs_{}.txt".format(n))   # not in the working directory
+process = multiprocessing.get_context("fork").Process(target=siqs_checkpoint,args=(8000,32768,n,path))
+process.start()
+time.sleep(1)
+process.kill()                            # the run is pre-empted
+print(len(read_checkpoint(path)[2]),"relations saved")
+strt = time.perf_counter()
+print(resume(path))
+end = time.perf_counter()
+print(f'Time taken = {end-strt}')
+os.remove(path)
+
+
+# In[ ]:
+
+
+n = 7000000000282000000000351            # a QS run stopped twice in the middle of a block
+path = os.path.join(tempfile.mkdtemp(),"qs_{}.txt".format(n))
+for i in range(2):
+    process = multiprocessing.get_context("fork").Process(target=qsa_checkpoint,args=(3000,10**7,n,path),kwargs={"chunk": 1<<22})
+    process.start()
+    time.sleep(2.5)
+    process.kill()
+    process.join()
+    x_values = [u for dic,u in read_checkpoint(path)[2]]
+    print(len(x_values),"relations saved,",len(set(x_values)),"different")
+    assert len(x_values) == len(set(x_values))
+print(resume(path))
+x_values = [u for dic,u in read_checkpoint(path)[2]]
+assert len(x_values) == len(set(x_values))
+os.remove(path)
+
@@ -33,29 +33,25 @@
 # - If $2\mid a$and $n\ (mod\ 8)\in \{3,5\}$, result is $-\big(\frac{a/2}{n}\big)$
 # - If $a>1$ and $a\ (mod\ 4)=1$ or $n\ (mod\ 4)=1$, result is $\big(\frac{n\ mod\ a}{n}\big)$
 # - If $a\ (mod\ 4)=3$ and $n\ (mod\ 4)=3$, result is $- \big(\frac{n\ mod\ a}{n}\big)$
+# 
+# Below all factors $2$ of $a=2^z a'$ are removed at once, with the number $z$ of trailing zero bits of $a$: by the two rules above the sign changes only if $z$ is odd and $n\ (mod\ 8)\in \{3,5\}$. Everything is done with integers, so there is no loss of precision for large $a$ and $n$.
 
 # In[6]:
 
 
-def jacobi(N,x):
+def jacobi(N,x):   # for odd N, with integers only
         b=x%N
         c=N
         s=1
-        while b>=2:
-            while b%4==0:
-                b = b/4
-            if b%2 == 0:
-                if c%8==3 or c%8==5:
-                    s = -s
-                b=b/2
-            if b==1:
-                break
+        while b:
+            z = (b & -b).bit_length()-1   # trailing zeros of b, all the factors 2 at once
+            b = b>>z
+            if z%2 == 1 and c%8 in (3,5):
+                s = -s
             if b%4==c%4==3:
                 s=-s
-            b1=b
-            b=c%b
-            c=b1
-        return s
+            b,c = c%b,b
+        return s if c == 1 else 0
 
 
 # In[49]:
@@ -89,7 +85,7 @@ def sstest(number):
         if gcd!=1:
             return "Composite"
         else:
-            euler = pow(base,int((number-1)/2),number)
+            euler = pow(base,(number-1)//2,number)
             jacob = jacobi(number,base)
             if euler != 1:
                 if euler!= number-1:        
@@ -113,10 +109,9 @@ def sstest(number):
 import random 
 def sstest(number,k):
             base = random.randint(2,number-1)
-            gcd = m.gcd(base,number)
-            euler = pow(base,int((number-1)/2),number)
-            jacob = jacobi(number,base)
             for i in range(k):
+                euler = pow(base,(number-1)//2,number)
+                jacob = jacobi(number,base)
                 if euler != 1:
                     if euler!= number-1:        
                         return "Composite"
@@ -198,23 +193,32 @@ def fermat(n,k):
 
 # MILLER RABIN TEST
 import random 
-def rabin_miller(N,k): # N : Any odd integer
-        m=(N-1)/2
-        h=1
-        while m%2==0:
-            m=int(m/2)
-            h = h+1
-        m = int(m)
-        for i in range(k):
-            x = random.randint(2,N-1)
-            if pow(x,m,N)!=1:
-                l=0
-                for j in range(h):
-                    if pow(x,pow(2,j)*m,N)!=N-1:
-                        l=l+1
-                if l==h:
-                    return "Composite"
-        return "Undecided"
+witnesses = [(2047,[2]),(1373653,[2,3]),(25326001,[2,3,5]),(3215031751,[2,3,5,7]),(2152302898747,[2,3,5,7,11]),
+             (3474749660383,[2,3,5,7,11,13]),(341550071728321,[2,3,5,7,11,13,17]),
+             (2**64,[2,325,9375,28178,450775,9780504,1795265022]),
+             (318665857834031151167461,[2,3,5,7,11,13,17,19,23,29,31,37]),
+             (3317044064679887385961981,[2,3,5,7,11,13,17,19,23,29,31,37,41])]   # (bound, bases) proven for all N < bound
+def rabin_miller(N,k): # N : Any odd integer > 1, k random bases when N is above all bounds
+        h=((N-1)&(1-N)).bit_length()-1   # N-1 = 2^h*m with m odd
+        m=(N-1)>>h
+        bases=next((bases for bound,bases in witnesses if N<bound),None)
+        deterministic=bases is not None
+        if not deterministic:
+            bases=[random.randint(2,N-1) for i in range(k)]
+        for x in bases:
+            x=x%N
+            if x==0:
+                continue
+            y=pow(x,m,N)
+            if y==1 or y==N-1:
+                continue
+            for j in range(h-1):             # x^(2^j*m) by squaring
+                y=y*y%N
+                if y==N-1:
+                    break
+            else:
+                return "Composite"
+        return "Prime" if deterministic else "Undecided"
 
 
 # In[52]: